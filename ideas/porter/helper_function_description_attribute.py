@@ -1,4 +1,12 @@
+from typing import Any, Callable
+
+
 class HelperFunctionDescriptionAttribute:
 
     def __init__(self, description=None):
-        self.description = description
\ No newline at end of file
+        self.description = description
+
+    def __call__(self, function: Callable[..., Any]) -> Callable[..., Any]:
+        # Used as a decorator, like the C# attribute: @HelperFunctionDescriptionAttribute('Gets the weather')
+        function.helper_function_description = self.description
+        return function
@@ -0,0 +1,30 @@
+from typing import Any, Callable, Optional, Sequence
+
+
+class HelperFunctionExecutionPolicy:
+
+    INLINE = 'inline'
+    THREAD = 'thread'
+    PROCESS = 'process'
+
+    # mode: INLINE runs on the caller's event loop; THREAD on a shared thread pool, so a blocking function
+    # doesn't stall other sessions; PROCESS in a warm worker process, for CPU-bound or untrusted functions.
+    # timeout: seconds; a PROCESS worker that overruns is killed, a THREAD call is abandoned, and an INLINE one must
+    # be a coroutine function, cancelled at its next await (a sync INLINE function with a timeout is rejected).
+    # max_concurrency: how many calls of the function may run at once; further calls wait their turn.
+    # memory_limit_bytes: the PROCESS worker's address space limit, where the platform supports one.
+    # preload_modules: modules a PROCESS worker imports when it starts, so the first call doesn't pay for them.
+    def __init__(self, mode: str = INLINE, timeout: Optional[float] = None, max_concurrency: Optional[int] = None,
+                 memory_limit_bytes: Optional[int] = None, preload_modules: Sequence[str] = ()):
+        if mode not in (self.INLINE, self.THREAD, self.PROCESS):
+            raise ValueError(f'Unknown execution mode: {mode}')
+        self.mode = mode
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.memory_limit_bytes = memory_limit_bytes
+        self.preload_modules = tuple(preload_modules)
+
+    def __call__(self, function: Callable[..., Any]) -> Callable[..., Any]:
+        # Used as a decorator: @HelperFunctionExecutionPolicy('process', timeout=5)
+        function.helper_function_execution_policy = self
+        return function
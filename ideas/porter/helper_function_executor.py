@@ -0,0 +1,327 @@
+import asyncio
+import functools
+import importlib
+import importlib.util
+import inspect
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from helper_function_execution_policy import HelperFunctionExecutionPolicy
+
+try:
+    import resource
+except ImportError:
+    resource = None  # not available on Windows, where memory limits are not enforced
+
+
+def _load_module(name_or_path: str, modules: Dict[str, Any]) -> Any:
+    module = modules.get(name_or_path)
+    if module is None:
+        if name_or_path.endswith('.py'):
+            spec = importlib.util.spec_from_file_location('custom_funcs', name_or_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        else:
+            module = importlib.import_module(name_or_path)
+        modules[name_or_path] = module
+    return module
+
+
+def _get_function_file(function: Callable[..., Any]) -> str:
+    # Stand-ins for functions that haven't been imported yet say where the real one is
+    return getattr(function, 'helper_function_file', None) or function.__code__.co_filename
+
+
+def _is_async(function: Callable[..., Any]) -> bool:
+    # Stand-ins for indexed functions are coroutines whatever the real function is, so they say which it is
+    is_async = getattr(function, 'helper_function_is_async', None)
+    return asyncio.iscoroutinefunction(function) if is_async is None else is_async
+
+
+def _call_soon(loop: asyncio.AbstractEventLoop, callback: Callable[[], None]) -> None:
+    # From a worker thread; a loop that has since closed has no one left to hand the callback to
+    try:
+        loop.call_soon_threadsafe(callback)
+    except RuntimeError:
+        pass
+
+
+def _run_worker(connection: Any, memory_limit_bytes: Optional[int], preload_modules: Tuple[str, ...]) -> None:
+    # Runs in the worker process: ('load', module) requests warm it up, ('call', file, name, arguments) requests
+    # get a (succeeded, result or exception) reply
+    if memory_limit_bytes and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+
+    modules: Dict[str, Any] = {}
+    for module in preload_modules:
+        _load_module(module, modules)
+
+    while True:
+        try:
+            request = connection.recv()
+        except (EOFError, OSError):
+            return
+
+        if request[0] == 'load':
+            try:
+                _load_module(request[1], modules)
+            except Exception:
+                pass  # reported when a call needs the module
+            continue
+
+        _, file, function_name, arguments = request
+        try:
+            result = getattr(_load_module(file, modules), function_name)(**arguments)
+            if inspect.iscoroutine(result):
+                result = asyncio.run(result)
+            reply = (True, result)
+        except BaseException as e:
+            reply = (False, e)
+        try:
+            connection.send(reply)
+        except Exception as e:
+            # The result or exception can't be pickled, so the caller gets a description of it instead
+            connection.send((False, RuntimeError(f'{function_name} returned a value that cannot be sent back: {e}')))
+
+
+class _Worker:
+
+    def __init__(self, context: Any, memory_limit_bytes: Optional[int], preload_modules: Tuple[str, ...]):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_run_worker, args=(child_connection, memory_limit_bytes, preload_modules), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class HelperFunctionWorkerLimit:
+
+    # The most worker processes all the pools sharing it may run together. When it is reached, a pool that needs
+    # a worker retires an idle one of another pool, or waits for a worker to come free.
+    def __init__(self, max_workers: int):
+        self.condition = threading.Condition()
+        self._max_workers = max_workers
+        self._workers = 0
+        self._pools: List['HelperFunctionProcessPool'] = []
+
+    def add_pool(self, pool: 'HelperFunctionProcessPool') -> None:
+        with self.condition:
+            self._pools.append(pool)
+
+    def reserve(self) -> Tuple[bool, Optional[_Worker]]:
+        # Called with the condition held. Returns whether a worker may be started, and an idle worker of another
+        # pool that made room for it, for the caller to kill once it has released the condition.
+        if self._workers < self._max_workers:
+            self._workers += 1
+            return True, None
+        for pool in self._pools:
+            retired = pool.retire_idle()
+            if retired is not None:
+                return True, retired
+        return False, None
+
+    def release(self) -> None:
+        with self.condition:
+            self._workers -= 1
+            self.condition.notify_all()
+
+
+class HelperFunctionProcessPool:
+
+    # Warm worker processes that keep their modules imported between calls. Workers are started when calls need
+    # them, not up front, and a worker that overruns its timeout or dies is killed; the next call starts a new one.
+    def __init__(self, limit: Union[int, HelperFunctionWorkerLimit], memory_limit_bytes: Optional[int] = None, preload_modules: Tuple[str, ...] = ()):
+        # The platform's default start method: where that is fork, workers start with the caller's modules already imported
+        self._context = multiprocessing.get_context()
+        self._memory_limit_bytes = memory_limit_bytes
+        self._preload_modules: List[str] = list(preload_modules)
+        self._lock = threading.Lock()
+        self._idle: List[_Worker] = []
+        self._limit = limit if isinstance(limit, HelperFunctionWorkerLimit) else HelperFunctionWorkerLimit(limit)
+        self._limit.add_pool(self)
+
+    def preload(self, module: str) -> None:
+        # Workers started from now on import it at startup; the idle ones import it before their next call
+        with self._lock:
+            if module in self._preload_modules:
+                return
+            self._preload_modules.append(module)
+            for worker in self._idle:
+                worker.connection.send(('load', module))
+
+    def call(self, file: str, function_name: str, arguments: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        # Blocks until a worker is free and the call finishes, so the executor runs it on a thread
+        worker = self._acquire()
+        try:
+            worker.connection.send(('call', file, function_name, arguments))
+            finished = worker.connection.poll(timeout)
+            if finished:
+                succeeded, result = worker.connection.recv()
+        except (EOFError, OSError):
+            self._discard(worker)
+            raise RuntimeError(f'The worker process running {function_name} exited')
+
+        if not finished:
+            self._discard(worker)
+            raise TimeoutError(f'{function_name} did not finish within {timeout}s')
+        with self._limit.condition:
+            with self._lock:
+                self._idle.append(worker)
+            self._limit.condition.notify_all()
+
+        if not succeeded:
+            raise result
+        return result
+
+    def retire_idle(self) -> Optional[_Worker]:
+        # Called by the limit, with its condition held, to make room for another pool's worker
+        with self._lock:
+            return self._idle.pop() if self._idle else None
+
+    def shutdown(self) -> None:
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            self._discard(worker)
+
+    def _acquire(self) -> _Worker:
+        with self._limit.condition:
+            while True:
+                with self._lock:
+                    if self._idle:
+                        return self._idle.pop()
+                reserved, retired = self._limit.reserve()
+                if reserved:
+                    break
+                self._limit.condition.wait()
+
+        if retired is not None:
+            retired.kill()
+        try:
+            return _Worker(self._context, self._memory_limit_bytes, tuple(self._preload_modules))
+        except BaseException:
+            self._limit.release()
+            raise
+
+    def _discard(self, worker: _Worker) -> None:
+        worker.kill()
+        self._limit.release()
+
+
+class HelperFunctionExecutor:
+
+    # Runs helper functions according to their HelperFunctionExecutionPolicy. Process pools are shared by
+    # functions with the same memory limit and preloaded modules, and process_pool_size caps their workers in total.
+    def __init__(self, max_threads: int = 8, process_pool_size: Optional[int] = None):
+        self._max_threads = max_threads
+        self._worker_limit = HelperFunctionWorkerLimit(process_pool_size or os.cpu_count() or 1)
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pools: Dict[Tuple[Optional[int], Tuple[str, ...]], HelperFunctionProcessPool] = {}
+        # An asyncio.Semaphore belongs to one event loop, so each loop gets its own
+        self._semaphores: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Callable[..., Any], asyncio.Semaphore]]' = weakref.WeakKeyDictionary()
+        self._pending_preloads: Dict[Tuple[Optional[int], Tuple[str, ...]], List[str]] = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, function: Callable[..., Any], policy: HelperFunctionExecutionPolicy) -> None:
+        # Called when a function is registered. Nothing is started or imported yet: the function's module is
+        # remembered and preloaded by its pool's workers once one of its functions is first called.
+        if policy.mode == HelperFunctionExecutionPolicy.INLINE and policy.timeout is not None and not _is_async(function):
+            raise ValueError(f'{function.__name__} runs inline on the event loop, where a timeout cannot stop it; use the thread or process mode')
+        if policy.mode != HelperFunctionExecutionPolicy.PROCESS:
+            return
+        key = (policy.memory_limit_bytes, policy.preload_modules)
+        with self._lock:
+            pool = self._process_pools.get(key)
+            if pool is None:
+                self._pending_preloads.setdefault(key, []).append(_get_function_file(function))
+                return
+        pool.preload(_get_function_file(function))
+
+    async def execute(self, function: Callable[..., Any], arguments: Dict[str, Any], policy: HelperFunctionExecutionPolicy) -> Any:
+        semaphore = self._get_semaphore(function, policy)
+        if semaphore is None:
+            return await self._execute(function, arguments, policy)
+        await semaphore.acquire()
+        if policy.mode == HelperFunctionExecutionPolicy.THREAD:
+            # A THREAD call that times out is abandoned but its thread keeps running, so its slot is only
+            # given back when the thread finishes, not when the caller stops waiting
+            return await self._execute_thread(function, arguments, policy, semaphore.release)
+        try:
+            return await self._execute(function, arguments, policy)
+        finally:
+            semaphore.release()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pools, self._process_pools = list(self._process_pools.values()), {}
+            thread_pool, self._thread_pool = self._thread_pool, None
+        for pool in pools:
+            pool.shutdown()
+        if thread_pool is not None:
+            thread_pool.shutdown(wait=False)
+
+    async def _execute(self, function: Callable[..., Any], arguments: Dict[str, Any], policy: HelperFunctionExecutionPolicy) -> Any:
+        loop = asyncio.get_running_loop()
+        if policy.mode == HelperFunctionExecutionPolicy.PROCESS:
+            pool = self._get_process_pool(policy)
+            call = functools.partial(pool.call, _get_function_file(function), function.__name__, arguments, policy.timeout)
+            return await loop.run_in_executor(self._get_thread_pool(), call)
+
+        if policy.mode == HelperFunctionExecutionPolicy.THREAD:
+            return await self._execute_thread(function, arguments, policy)
+
+        if asyncio.iscoroutinefunction(function):
+            return await asyncio.wait_for(function(**arguments), policy.timeout)
+        return function(**arguments)
+
+    async def _execute_thread(self, function: Callable[..., Any], arguments: Dict[str, Any], policy: HelperFunctionExecutionPolicy,
+                              release: Optional[Callable[[], None]] = None) -> Any:
+        loop = asyncio.get_running_loop()
+        try:
+            if asyncio.iscoroutinefunction(function):
+                call = functools.partial(asyncio.run, function(**arguments))
+            else:
+                call = functools.partial(function, **arguments)
+            future = self._get_thread_pool().submit(call)
+        except BaseException:
+            if release is not None:
+                release()
+            raise
+
+        if release is not None:
+            future.add_done_callback(lambda _: _call_soon(loop, release))
+        return await asyncio.wait_for(asyncio.wrap_future(future), policy.timeout)
+
+    def _get_semaphore(self, function: Callable[..., Any], policy: HelperFunctionExecutionPolicy) -> Optional[asyncio.Semaphore]:
+        if policy.max_concurrency is None:
+            return None
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphores = self._semaphores.setdefault(loop, {})
+            semaphore = semaphores.get(function)
+            if semaphore is None:
+                semaphore = semaphores[function] = asyncio.Semaphore(policy.max_concurrency)
+            return semaphore
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(self._max_threads, thread_name_prefix='helper-function')
+            return self._thread_pool
+
+    def _get_process_pool(self, policy: HelperFunctionExecutionPolicy) -> HelperFunctionProcessPool:
+        key = (policy.memory_limit_bytes, policy.preload_modules)
+        with self._lock:
+            pool = self._process_pools.get(key)
+            if pool is None:
+                preload_modules = policy.preload_modules + tuple(self._pending_preloads.pop(key, ()))
+                pool = self._process_pools[key] = HelperFunctionProcessPool(self._worker_limit, policy.memory_limit_bytes, preload_modules)
+            return pool
@@ -1,13 +1,60 @@
-import asyncio
+import enum
 import inspect
 import json
+import types
+import typing
 from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
 
+from helper_function_execution_policy import HelperFunctionExecutionPolicy
+from helper_function_executor import HelperFunctionExecutor
+from helper_function_parameter_description_attribute import HelperFunctionParameterDescriptionAttribute
+
+
+JSON_SCHEMA_TYPES: Dict[Any, str] = {
+    str: 'string',
+    int: 'integer',
+    float: 'number',
+    bool: 'boolean',
+    list: 'array',
+    tuple: 'array',
+    set: 'array',
+    dict: 'object',
+}
+
+# `Optional[int]` and `int | None` (PEP 604, Python 3.10+) have different origins
+UNION_ORIGINS: Tuple[Any, ...] = (Union, types.UnionType) if hasattr(types, 'UnionType') else (Union,)
+
+
+class _FrozenDict(dict):
+
+    # Schemas are built once and shared by every request, so callers get them read-only: changing one would
+    # change what every later request sends. Still a dict, so json and the SDK serialize it as usual.
+    def _read_only(self, *args: Any, **kwargs: Any) -> None:
+        raise TypeError('Function schemas are shared and read-only; copy one to change it')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only  # type: ignore[assignment]
+
+    def __reduce__(self) -> Any:
+        return _FrozenDict, (dict(self),)
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return _FrozenDict((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
 
 class HelperFunctionFactory:
 
-    def __init__(self):
+    def __init__(self, executor: Optional[HelperFunctionExecutor] = None):
+        self._executor = executor or HelperFunctionExecutor()
         self._functions: Dict[str, Callable[..., Any]] = {}
+        self._function_policies: Dict[str, HelperFunctionExecutionPolicy] = {}
+        self._function_specs: Dict[str, Tuple[str, str]] = {}
+        self._function_schemas: Dict[str, Dict[str, Any]] = {}
+        self._function_schemas_payload: Optional[Tuple[Tuple[Dict[str, Any], ...], str]] = None
 
     async def call_function(self, function_name: str, arguments_as_json: str) -> Any:
         function = self._functions.get(function_name)
@@ -15,26 +62,111 @@ class HelperFunctionFactory:
             raise KeyError(f'Function not found: {function_name}')
 
         arguments = json.loads(arguments_as_json)
-        if asyncio.iscoroutinefunction(function):
-            return await function(**arguments)
-        else:
-            return function(**arguments)
+        return await self._executor.execute(function, arguments, self._function_policies[function_name])
+
+    def add_function(self, function_name: str, function: Callable[..., Any], policy: Optional[HelperFunctionExecutionPolicy] = None) -> None:
+        # Without a policy, the function's own (from the HelperFunctionExecutionPolicy decorator) applies,
+        # and without one of those it runs inline, as before
+        policy = policy or getattr(function, 'helper_function_execution_policy', None) or HelperFunctionExecutionPolicy()
+        self._executor.prepare(function, policy)
 
-    def add_function(self, function_name: str, function: Callable[..., Any]) -> None:
+        # Specs and schemas are worked out once here, not on every request that lists the functions
+        signature = inspect.signature(function)
         self._functions[function_name] = function
+        self._function_policies[function_name] = policy
+        self._function_specs[function_name] = (str(signature.parameters), str(signature.return_annotation))
+        self._function_schemas[function_name] = _freeze(self._create_function_schema(function_name, function, signature))
+        self._function_schemas_payload = None
 
     def remove_function(self, function_name: str) -> None:
         self._functions.pop(function_name, None)
+        self._function_policies.pop(function_name, None)
+        self._function_specs.pop(function_name, None)
+        self._function_schemas.pop(function_name, None)
+        self._function_schemas_payload = None
 
     def list_functions(self) -> List[str]:
         return list(self._functions.keys())
 
     def get_function_spec(self, function_name: str) -> Optional[Tuple[str, str]]:
-        function = self._functions.get(function_name)
-        if function is None:
-            return None
+        return self._function_specs.get(function_name)
 
-        signature = inspect.signature(function)
-        parameters = str(signature.parameters)
-        return_type = str(signature.return_annotation)
-        return parameters, return_type
\ No newline at end of file
+    def get_function_policy(self, function_name: str) -> Optional[HelperFunctionExecutionPolicy]:
+        return self._function_policies.get(function_name)
+
+    def get_function_schema(self, function_name: str) -> Optional[Dict[str, Any]]:
+        return self._function_schemas.get(function_name)
+
+    def get_function_schemas(self) -> Tuple[Dict[str, Any], ...]:
+        return self._get_function_schemas_payload()[0]
+
+    def get_function_schemas_json(self) -> str:
+        return self._get_function_schemas_payload()[1]
+
+    def _get_function_schemas_payload(self) -> Tuple[Tuple[Dict[str, Any], ...], str]:
+        # Built on first use after the registry changes, then shared by every request until it changes again
+        if self._function_schemas_payload is None:
+            schemas = tuple(self._function_schemas.values())
+            self._function_schemas_payload = (schemas, json.dumps(schemas))
+        return self._function_schemas_payload
+
+    def _create_function_schema(self, function_name: str, function: Callable[..., Any], signature: inspect.Signature) -> Dict[str, Any]:
+        try:
+            type_hints = typing.get_type_hints(function, include_extras=True)
+        except Exception:
+            type_hints = {name: parameter.annotation for name, parameter in signature.parameters.items()}
+
+        properties: Dict[str, Any] = {}
+        required: List[str] = []
+        for name, parameter in signature.parameters.items():
+            if parameter.kind in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD):
+                continue
+
+            annotation = type_hints.get(name, inspect.Parameter.empty)
+            properties[name] = self._create_parameter_schema(annotation)
+            if parameter.default is inspect.Parameter.empty and not self._is_optional(annotation):
+                required.append(name)
+
+        description = getattr(function, 'helper_function_description', None) or (inspect.getdoc(function) or '').split('\n\n')[0]
+        schema: Dict[str, Any] = {'name': function_name, 'parameters': {'type': 'object', 'properties': properties, 'required': required}}
+        if description:
+            schema['description'] = description
+        return schema
+
+    def _create_parameter_schema(self, annotation: Any) -> Dict[str, Any]:
+        description = None
+        if typing.get_origin(annotation) is typing.Annotated:
+            metadata = annotation.__metadata__
+            annotation = typing.get_args(annotation)[0]
+            description = next((item.description for item in metadata if isinstance(item, HelperFunctionParameterDescriptionAttribute)), None)
+
+        schema = self._create_type_schema(annotation)
+        if description:
+            schema['description'] = description
+        return schema
+
+    def _create_type_schema(self, annotation: Any) -> Dict[str, Any]:
+        if annotation is inspect.Parameter.empty or annotation is Any:
+            return {}
+
+        origin = typing.get_origin(annotation)
+        args = typing.get_args(annotation)
+        if origin in UNION_ORIGINS:
+            types = [arg for arg in args if arg is not type(None)]
+            return self._create_type_schema(types[0]) if len(types) == 1 else {'anyOf': [self._create_type_schema(arg) for arg in types]}
+        if origin is typing.Literal:
+            return {'enum': list(args)}
+        if origin in (list, tuple, set):
+            return {'type': 'array', 'items': self._create_type_schema(args[0])} if args else {'type': 'array'}
+        if origin is dict:
+            return {'type': 'object'}
+        if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+            return {'enum': [member.value for member in annotation]}
+
+        json_type = JSON_SCHEMA_TYPES.get(annotation)
+        return {'type': json_type} if json_type else {}
+
+    def _is_optional(self, annotation: Any) -> bool:
+        if typing.get_origin(annotation) is typing.Annotated:
+            annotation = typing.get_args(annotation)[0]
+        return typing.get_origin(annotation) in UNION_ORIGINS and type(None) in typing.get_args(annotation)
@@ -9,6 +9,7 @@ def add_functions(options: Dict[str, Any], function_factory: helper_function_fac
         options['functions'][function_name] = {
             'parameters': parameters,
             'return_type': return_type,
+            'schema': function_factory.get_function_schema(function_name),
         }
     return options
 
@@ -2,11 +2,22 @@ import os
 import glob
 import importlib.util
 import inspect
+from typing import Dict, Optional
 
+from helper_function_execution_policy import HelperFunctionExecutionPolicy
 from helper_function_factory import HelperFunctionFactory
-
-def create_function_factory_for_custom_functions(custom_functions: str) -> HelperFunctionFactory:
+from helper_function_module_index import HelperFunctionModuleIndex
+
+def create_function_factory_for_custom_functions(custom_functions: str, policies: Optional[Dict[str, HelperFunctionExecutionPolicy]] = None,
+                                                 default_policy: Optional[HelperFunctionExecutionPolicy] = None,
+                                                 index: Optional[HelperFunctionModuleIndex] = None) -> HelperFunctionFactory:
+    # policies: execution policies by function name; other functions get default_policy, or their own
+    # from the HelperFunctionExecutionPolicy decorator, or run inline.
+    # index: when given, modules aren't run here; their functions come from the index (which parses any new
+    # or changed files) and each module is imported when one of its functions is first called. Only functions
+    # defined at the top level of a module are found this way, not ones it imports or creates at runtime.
     factory = HelperFunctionFactory()
+    policies = policies or {}
 
     patterns = custom_functions.replace('\r', ';').replace('\n', ';').split(';')
     for pattern in patterns:
@@ -16,15 +27,26 @@ def create_function_factory_for_custom_functions(custom_functions: str) -> Helpe
 
         for file in files:
             print(f"Trying to load custom functions from: {file}")
+            if index is not None:
+                for function_info in index.get_functions(file):
+                    factory.add_function(function_info['name'], index.create_function(file, function_info), policies.get(function_info['name'], default_policy))
+                continue
+
             spec = importlib.util.spec_from_file_location("custom_funcs", file)
             custom_funcs = importlib.util.module_from_spec(spec)
             spec.loader.exec_module(custom_funcs)
 
             for func_name, func in inspect.getmembers(custom_funcs, inspect.isfunction):
-                factory.add_function(func_name, func)
+                factory.add_function(func_name, func, policies.get(func_name, default_policy))
 
+    if index is not None:
+        index.save()
     return factory
 
 
 # Usage:
-# factory = create_function_factory_for_custom_functions(custom_functions)
\ No newline at end of file
+# factory = create_function_factory_for_custom_functions(custom_functions)
+# factory = create_function_factory_for_custom_functions(custom_functions, {
+#     'standard_deviation': HelperFunctionExecutionPolicy('process', timeout=5, memory_limit_bytes=512 * 1024 * 1024),
+# })
+# factory = create_function_factory_for_custom_functions(custom_functions, index=HelperFunctionModuleIndex())
\ No newline at end of file
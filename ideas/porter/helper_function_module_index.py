@@ -0,0 +1,216 @@
+import ast
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import threading
+import typing
+from typing import Any, Callable, Dict, List, Optional
+
+from helper_function_execution_policy import HelperFunctionExecutionPolicy
+from helper_function_parameter_description_attribute import HelperFunctionParameterDescriptionAttribute
+
+
+# What annotations in an indexed module may refer to; anything else is treated as unannotated
+ANNOTATION_NAMES: Dict[str, Any] = {
+    'None': None,
+    'str': str, 'int': int, 'float': float, 'bool': bool, 'list': list, 'tuple': tuple, 'set': set, 'dict': dict,
+    'typing': typing, 'Any': typing.Any, 'Optional': typing.Optional, 'Union': typing.Union, 'Literal': typing.Literal,
+    'Annotated': typing.Annotated, 'List': typing.List, 'Tuple': typing.Tuple, 'Set': typing.Set, 'Dict': typing.Dict,
+    'HelperFunctionParameterDescriptionAttribute': HelperFunctionParameterDescriptionAttribute,
+}
+
+PARAMETER_KINDS: Dict[str, Any] = {kind.name: kind for kind in (
+    inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.VAR_POSITIONAL,
+    inspect.Parameter.KEYWORD_ONLY, inspect.Parameter.VAR_KEYWORD)}
+
+
+class _DefaultSource:
+
+    # Stands in for a parameter's default value, which isn't evaluated, and shows its source in signatures
+    def __init__(self, source: str):
+        self.source = source
+
+    def __repr__(self) -> str:
+        return self.source
+
+
+class HelperFunctionModuleIndex:
+
+    # Function names, signatures and descriptions read from custom function modules without running them (by
+    # parsing their source), persisted so that unchanged files aren't even parsed again. A module is imported
+    # the first time one of its functions is called.
+    def __init__(self, index_path: Optional[str] = None):
+        self._index_path = index_path or os.path.join(os.path.expanduser('~'), '.ai', 'helper_function_index.json')
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._changed = False
+        self._modules: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get_functions(self, file: str) -> List[Dict[str, Any]]:
+        # Files whose modification time and size are unchanged are trusted; otherwise a file whose contents
+        # hash the same (e.g. after a checkout) keeps its entry, and only a changed file is parsed again
+        path = os.path.abspath(file)
+        stat = os.stat(path)
+        entries = self._get_entries()
+        entry = entries.get(path)
+        if entry is None or entry['mtime_ns'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+            with open(path, 'rb') as f:
+                source = f.read()
+            digest = hashlib.sha256(source).hexdigest()
+            if entry is None or entry['sha256'] != digest:
+                entry = {'sha256': digest, 'functions': self._scan_module(source, path)}
+            entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            entries[path] = entry
+            self._changed = True
+        return entry['functions']
+
+    def create_function(self, file: str, function_info: Dict[str, Any]) -> Callable[..., Any]:
+        # A stand-in with the indexed function's name, signature and description, which imports the
+        # module and calls the real function when it is first called
+        path = os.path.abspath(file)
+        function_name = function_info['name']
+
+        async def function(**arguments: Any) -> Any:
+            result = self.load_function(path, function_name)(**arguments)
+            return await result if inspect.isawaitable(result) else result
+
+        signature = self._create_signature(function_info)
+        function.__name__ = function.__qualname__ = function_name
+        function.__doc__ = function_info['description']
+        function.__signature__ = signature
+        function.__annotations__ = {name: parameter.annotation for name, parameter in signature.parameters.items()
+                                    if parameter.annotation is not inspect.Parameter.empty}
+        if signature.return_annotation is not inspect.Signature.empty:
+            function.__annotations__['return'] = signature.return_annotation
+        function.helper_function_file = path
+        function.helper_function_is_async = function_info.get('async')
+        if function_info.get('policy') is not None:
+            function.helper_function_execution_policy = HelperFunctionExecutionPolicy(*function_info['policy']['args'], **function_info['policy']['kwargs'])
+        return function
+
+    def load_function(self, file: str, function_name: str) -> Callable[..., Any]:
+        with self._lock:
+            module = self._modules.get(file)
+            if module is None:
+                spec = importlib.util.spec_from_file_location('custom_funcs', file)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self._modules[file] = module
+        return getattr(module, function_name)
+
+    def save(self) -> None:
+        if not self._changed:
+            return
+
+        entries = {path: entry for path, entry in self._get_entries().items() if os.path.exists(path)}
+        os.makedirs(os.path.dirname(self._index_path) or '.', exist_ok=True)
+        temp_path = f'{self._index_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(temp_path, self._index_path)
+        self._changed = False
+
+    def _get_entries(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            try:
+                with open(self._index_path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _scan_module(self, source: bytes, path: str) -> List[Dict[str, Any]]:
+        tree = ast.parse(source, path)
+        return [self._scan_function(node) for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+
+    def _scan_function(self, node: Any) -> Dict[str, Any]:
+        args = node.args
+        positional = args.posonlyargs + args.args
+        defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+
+        parameters: List[Dict[str, Any]] = []
+        for index, arg in enumerate(positional):
+            kind = 'POSITIONAL_ONLY' if index < len(args.posonlyargs) else 'POSITIONAL_OR_KEYWORD'
+            parameters.append(self._scan_parameter(arg, kind, defaults[index]))
+        if args.vararg is not None:
+            parameters.append(self._scan_parameter(args.vararg, 'VAR_POSITIONAL', None))
+        for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+            parameters.append(self._scan_parameter(arg, 'KEYWORD_ONLY', default))
+        if args.kwarg is not None:
+            parameters.append(self._scan_parameter(args.kwarg, 'VAR_KEYWORD', None))
+
+        function_info: Dict[str, Any] = {
+            'name': node.name,
+            'async': isinstance(node, ast.AsyncFunctionDef),
+            'parameters': parameters,
+            'returns': ast.unparse(node.returns) if node.returns is not None else None,
+            'description': ast.get_docstring(node),
+            'policy': None,
+        }
+
+        # Decorators are only understood when they are these two, called with literal arguments
+        for decorator in node.decorator_list:
+            if not isinstance(decorator, ast.Call):
+                continue
+            name = decorator.func.attr if isinstance(decorator.func, ast.Attribute) else getattr(decorator.func, 'id', None)
+            try:
+                decorator_args = [ast.literal_eval(arg) for arg in decorator.args]
+                decorator_kwargs = {keyword.arg: ast.literal_eval(keyword.value) for keyword in decorator.keywords}
+            except ValueError:
+                continue
+            if name == 'HelperFunctionDescriptionAttribute':
+                function_info['description'] = (decorator_args + [decorator_kwargs.get('description')])[0]
+            elif name == 'HelperFunctionExecutionPolicy':
+                function_info['policy'] = {'args': decorator_args, 'kwargs': decorator_kwargs}
+        return function_info
+
+    def _scan_parameter(self, arg: Any, kind: str, default: Any) -> Dict[str, Any]:
+        return {
+            'name': arg.arg,
+            'kind': kind,
+            'annotation': ast.unparse(arg.annotation) if arg.annotation is not None else None,
+            'default': ast.unparse(default) if default is not None else None,
+        }
+
+    def _create_signature(self, function_info: Dict[str, Any]) -> inspect.Signature:
+        # Defaults are only needed to tell required parameters from optional ones, never as values, since
+        # a call goes to the real function
+        parameters = [
+            inspect.Parameter(
+                parameter['name'],
+                PARAMETER_KINDS[parameter['kind']],
+                default=_DefaultSource(parameter['default']) if parameter['default'] is not None else inspect.Parameter.empty,
+                annotation=self._evaluate_annotation(parameter['annotation']))
+            for parameter in function_info['parameters']]
+        return inspect.Signature(parameters, return_annotation=self._evaluate_annotation(function_info['returns']))
+
+    def _evaluate_annotation(self, annotation: Optional[str]) -> Any:
+        if annotation is None:
+            return inspect.Parameter.empty
+        try:
+            return self._evaluate_annotation_node(ast.parse(annotation, mode='eval').body)
+        except Exception:
+            return inspect.Parameter.empty
+
+    def _evaluate_annotation_node(self, node: Any) -> Any:
+        # Walks the annotation's syntax tree rather than running it, so only the names in ANNOTATION_NAMES,
+        # typing attributes, subscripts, literals, `X | Y` unions and parameter descriptions are understood
+        if isinstance(node, ast.Name):
+            return ANNOTATION_NAMES[node.id]
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == 'typing':
+            return getattr(typing, node.attr)
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Tuple):
+            return tuple(self._evaluate_annotation_node(element) for element in node.elts)
+        if isinstance(node, ast.Subscript):
+            return self._evaluate_annotation_node(node.value)[self._evaluate_annotation_node(node.slice)]
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+            return typing.Union[self._evaluate_annotation_node(node.left), self._evaluate_annotation_node(node.right)]
+        if isinstance(node, ast.Call) and self._evaluate_annotation_node(node.func) is HelperFunctionParameterDescriptionAttribute:
+            args = [ast.literal_eval(arg) for arg in node.args]
+            kwargs = {keyword.arg: ast.literal_eval(keyword.value) for keyword in node.keywords}
+            return HelperFunctionParameterDescriptionAttribute(*args, **kwargs)
+        raise ValueError(f'unsupported annotation: {ast.unparse(node)}')
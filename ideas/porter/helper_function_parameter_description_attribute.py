@@ -1,4 +1,6 @@
 class HelperFunctionParameterDescriptionAttribute:
 
+    # Used as Annotated metadata, like the C# parameter attribute:
+    # def get_weather(location: Annotated[str, HelperFunctionParameterDescriptionAttribute('The city')]) -> str
     def __init__(self, description=None):
-        self.description = description
\ No newline at end of file
+        self.description = description
@@ -1,23 +1,29 @@
 from azure.ai.inference import ChatCompletionsClient
 from azure.ai.inference.models import SystemMessage, UserMessage, AssistantMessage
 from azure.core.credentials import AzureKeyCredential
+from chat_history import ChatHistory
 
 class {ClassName}:
-    def __init__(self, chat_endpoint, chat_api_key, chat_model, chat_system_prompt):
+    def __init__(self, chat_endpoint, chat_api_key, chat_model, chat_system_prompt, max_history_tokens=None, history_summarizer=None):
         self.chat_system_prompt = chat_system_prompt
+        self.max_history_tokens = max_history_tokens
+        self.history_summarizer = history_summarizer
         self.chat_model = chat_model
         self.client = ChatCompletionsClient(endpoint=chat_endpoint, credential=AzureKeyCredential(chat_api_key))
         self.clear_conversation()
 
     def clear_conversation(self):
-        self.messages = [
-            SystemMessage(content=self.chat_system_prompt)
-        ];
+        self.messages = ChatHistory(
+            [SystemMessage(content=self.chat_system_prompt)],
+            max_tokens=self.max_history_tokens,
+            summarizer=self.history_summarizer,
+            message_factory=lambda role, content: SystemMessage(content=content))
 
     def get_chat_completions(self, user_input, callback):
         self.messages.append(UserMessage(content=user_input))
+        self.messages.trim()
 
-        complete_content = ''
+        content_chunks = []
         response = self.client.complete(
             messages=self.messages,
             model=self.chat_model,
@@ -32,8 +38,9 @@ class {ClassName}:
             content = update.choices[0].delta.content or ""
             if content is None: continue
 
-            complete_content += content
+            content_chunks.append(content)
             callback(content)
 
+        complete_content = ''.join(content_chunks)
         self.messages.append(AssistantMessage(content=complete_content))
         return complete_content
\ No newline at end of file
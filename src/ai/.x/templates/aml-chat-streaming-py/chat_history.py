@@ -0,0 +1 @@
+{{@include openai.py/chat_history.py}}
@@ -1,4 +1,5 @@
 from azureml_chat_completions_streaming import {ClassName}
+from output_sinks import CoalescingOutput, StdoutSink
 import os
 import sys
 
@@ -20,6 +21,7 @@ def main():
         sys.exit(1)
 
     chat = {ClassName}(chat_endpoint, chat_api_key, chat_model, chat_system_prompt)
+    output = CoalescingOutput(StdoutSink())
 
     while True:
         user_input = input('User: ')
@@ -27,7 +29,8 @@ def main():
             break
 
         print('\nAssistant: ', end='')
-        response = chat.get_chat_completions(user_input, lambda content: print(content, end=''))
+        response = chat.get_chat_completions(user_input, output)
+        output.flush()
         print('\n')
 
 if __name__ == '__main__':
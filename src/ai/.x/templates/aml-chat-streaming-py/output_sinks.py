@@ -0,0 +1 @@
+{{@include openai.py/output_sinks.py}}
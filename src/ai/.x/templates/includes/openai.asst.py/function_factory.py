@@ -1,25 +1,61 @@
+import json
+from frozen_json import freeze
+from function_cache import get_cache_policy, shared_function_cache
+from schema_validator import compile_validator, format_validation_error
+
 class FunctionFactory:
-    def __init__(self):
+    def __init__(self, cache=None):
         self.functions = {}
+        self.schemas = None
+        self.tools = None
+        self.cache = cache or shared_function_cache
 
-    def add_function(self, schema, func):
-        self.functions[schema['name']] = {'schema': schema, 'function': func}
+    def add_function(self, schema, func, cache=None):
+        # The parameters schema is compiled into a validator here, once, rather than interpreted on every call
+        self.functions[schema['name']] = {'schema': schema, 'function': func, 'cache': get_cache_policy(cache),
+            'validate': compile_validator(schema.get('parameters'))}
+        self.schemas = None
+        self.tools = None
 
+    # Built once per change to the registry and shared by every request, rather than rebuilt each turn,
+    # so they are frozen: changing one would change what every later request sends
     def get_function_schemas(self):
-        return [value['schema'] for value in self.functions.values()]
+        if self.schemas is None:
+            self.schemas = freeze([value['schema'] for value in self.functions.values()])
+        return self.schemas
 
     def get_tools(self):
-        return [
-            {"type": "function", "function": value["schema"]}
-            for value in self.functions.values()
-        ]
+        if self.tools is None:
+            self.tools = freeze([
+                {"type": "function", "function": value["schema"]}
+                for value in self.functions.values()
+            ])
+        return self.tools
+
+    def validate_arguments(self, function_name, function_arguments):
+        # Returns the arguments with obvious coercions applied (e.g. "3" for an integer) and None, or None
+        # and an error message for the model, so a bad call is answered without ever reaching the function
+        if isinstance(function_arguments, str):
+            try:
+                function_arguments = json.loads(function_arguments) if function_arguments else {}
+            except ValueError as e:
+                return None, format_validation_error(function_name, [{'path': '$', 'message': 'not valid JSON: %s' % e}])
+
+        arguments, errors = self.functions[function_name]['validate'](function_arguments)
+        return (arguments, None) if errors is None else (None, format_validation_error(function_name, errors))
 
     def try_call_function(self, function_name, function_arguments):
         function_info = self.functions.get(function_name)
         if function_info is None:
             return None
 
-        result = function_info['function'](function_arguments)
+        arguments, error = self.validate_arguments(function_name, function_arguments)
+        if error is not None:
+            result = error
+        elif function_info['cache'] is not None:
+            result = self.cache.call(function_name, arguments, function_info['cache'], function_info['function'])
+        else:
+            result = function_info['function'](arguments)
         print(f"\rassistant-function: {function_name}({function_arguments}) => {result}")
         print("\nAssistant: ", end='')
 
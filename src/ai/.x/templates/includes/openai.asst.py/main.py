@@ -1,6 +1,7 @@
 import os
 import sys
 from openai import OpenAI
+from http_clients import get_http_client
 {{if {_IS_OPENAI_ASST_FUNCTIONS_TEMPLATE}}}
 from openai_assistants_custom_functions import factory
 from openai_assistants_functions_streaming import {ClassName}
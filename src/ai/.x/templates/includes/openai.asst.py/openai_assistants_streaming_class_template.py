@@ -1,4 +1,5 @@
 {{if {_IS_OPENAI_ASST_STREAMING_TEMPLATE}}}
+from concurrent.futures import ThreadPoolExecutor
 from typing_extensions import override
 from openai import AssistantEventHandler
 
@@ -84,12 +85,17 @@ class EventHandler(AssistantEventHandler):
         self.submit_tool_outputs(tool_outputs, run_id)
 
     def get_tool_outputs(self, tool_calls):
-        tool_outputs = []
-        for tool_call in tool_calls:
-            if tool_call.type == 'function':
-                result = self.function_factory.try_call_function(tool_call.function.name, tool_call.function.arguments)
-                tool_outputs.append({ 'output': result, 'tool_call_id': tool_call.id })
-        return tool_outputs
+        function_calls = [tool_call for tool_call in tool_calls if tool_call.type == 'function']
+        call = lambda tool_call: self.function_factory.try_call_function(tool_call.function.name, tool_call.function.arguments)
+
+        # The calls of one run step are independent, so run them side by side; the outputs keep the calls' order
+        if len(function_calls) > 1:
+            with ThreadPoolExecutor(len(function_calls)) as executor:
+                results = list(executor.map(call, function_calls))
+        else:
+            results = [call(tool_call) for tool_call in function_calls]
+
+        return [{ 'output': result, 'tool_call_id': tool_call.id } for tool_call, result in zip(function_calls, results)]
 
     def submit_tool_outputs(self, tool_outputs, run_id):
         with self.openai.beta.threads.runs.submit_tool_outputs_stream(
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import chain
+
+def read_completed_ids(output_file):
+    # Returns the ids already answered. Error records (and a partially written last line from a crash) are
+    # dropped from the file, since those items are run again and their new records are appended.
+    completed = set()
+    if not os.path.exists(output_file):
+        return completed
+
+    kept, dropped = [], 0
+    with open(output_file, 'r', encoding='utf-8-sig') as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                dropped += 1
+                continue
+            if 'error' in result:
+                dropped += 1
+                continue
+            completed.add(result['id'])
+            kept.append(line if line.endswith('\n') else line + '\n')
+
+    if dropped:
+        temp_file = output_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            file.writelines(kept)
+        os.replace(temp_file, output_file)
+    return completed
+
+def read_batch_items(input_file):
+    with open(input_file, 'r', encoding='utf-8-sig') as file:
+        items = (json.loads(line) for line in file if line.strip())
+        first = next(items, None)
+        if first is None:
+            return
+
+        # A chat history file (one message per line, like `ai chat --output-chat-history-file`) is a single conversation
+        if 'role' in first:
+            yield os.path.basename(input_file), [first] + list(items)
+            return
+
+        for item_number, item in enumerate(chain([first], items), start=1):
+            yield item.get('id', item_number), get_batch_messages(item)
+
+def get_batch_messages(item):
+    return item.get('messages') or [{'role': 'user', 'content': item['prompt']}]
+
+class BatchRunner:
+    def __init__(self, create_chat, concurrency=8):
+        self.create_chat = create_chat
+        self.concurrency = concurrency
+        self.local = threading.local()
+
+    def run(self, input_file, output_file):
+        completed = read_completed_ids(output_file)
+        counts = {'completed': 0, 'skipped': 0, 'failed': 0}
+
+        with open(output_file, 'a', encoding='utf-8') as output, ThreadPoolExecutor(self.concurrency) as executor:
+            pending = set()
+            for item_id, messages in read_batch_items(input_file):
+                if item_id in completed:
+                    counts['skipped'] += 1
+                    continue
+
+                if len(pending) >= self.concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self.write_results(done, output, counts)
+
+                pending.add(executor.submit(self.run_item, item_id, messages))
+
+            done, _ = wait(pending)
+            self.write_results(done, output, counts)
+
+        return counts
+
+    def write_results(self, done, output, counts):
+        for future in done:
+            result = future.result()
+            counts['failed' if 'error' in result else 'completed'] += 1
+            output.write(json.dumps(result) + '\n')
+        output.flush()
+
+    def run_item(self, item_id, messages):
+        start = time.perf_counter()
+        try:
+            # One chat instance per worker thread, so its HTTP connections are reused across items. A chat that
+            # can't be created (bad endpoint or key) fails this item rather than the whole batch.
+            chat = getattr(self.local, 'chat', None)
+            if chat is None:
+                chat = self.local.chat = self.create_chat()
+
+            chat.clear_conversation()
+            last_user = max(i for i, message in enumerate(messages) if message.get('role') == 'user')
+            history, prompt = messages[:last_user], messages[last_user]['content']
+            if history and history[0].get('role') == 'system':
+                chat.messages.clear()
+            chat.messages.extend(history)
+
+            response = chat.get_chat_completions(prompt, lambda content: None)
+            return {'id': item_id, 'response': response, 'elapsed': round(time.perf_counter() - start, 3)}
+        except Exception as e:
+            return {'id': item_id, 'error': str(e), 'elapsed': round(time.perf_counter() - start, 3)}
+
+def run_batch(create_chat, input_file, output_file, concurrency=8):
+    counts = BatchRunner(create_chat, concurrency).run(input_file, output_file)
+    print(f"Batch done: {counts['completed']} completed, {counts['skipped']} skipped, {counts['failed']} failed")
+    return counts
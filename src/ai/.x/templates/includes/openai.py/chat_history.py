@@ -0,0 +1,223 @@
+import asyncio
+import inspect
+import json
+
+_encoding = None
+
+def count_text_tokens(text):
+    global _encoding
+    if not text:
+        return 0
+
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            _encoding = False
+
+    if _encoding:
+        return len(_encoding.encode(text))
+
+    # Roughly 4 characters per token for English text
+    return len(text) // 4 + 1
+
+def get_message_value(message, key):
+    if isinstance(message, dict):
+        return message.get(key)
+    return getattr(message, key, None)
+
+def count_message_tokens(message):
+    tokens = 4
+    for key in ['content', 'name']:
+        value = get_message_value(message, key)
+        if isinstance(value, str):
+            tokens += count_text_tokens(value)
+
+    for key in ['function_call', 'tool_calls']:
+        value = get_message_value(message, key)
+        if value:
+            tokens += count_text_tokens(json.dumps(value, default=str))
+
+    return tokens
+
+def create_summarizer(client, model):
+    def summarize(messages, previous_summary):
+        transcript = '\n'.join(f"{get_message_value(m, 'role')}: {get_message_value(m, 'content') or ''}" for m in messages)
+        if previous_summary:
+            transcript = f"Earlier summary: {previous_summary}\n{transcript}"
+
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {'role': 'system', 'content': 'Summarize the following conversation in a few sentences. Keep names, numbers and decisions.'},
+                {'role': 'user', 'content': transcript}
+            ])
+        return response.choices[0].message.content
+    return summarize
+
+def create_async_summarizer(client, model):
+    # For the async classes: awaited by ChatHistory.trim_async, so summarizing doesn't block the event loop
+    async def summarize(messages, previous_summary):
+        transcript = '\n'.join(f"{get_message_value(m, 'role')}: {get_message_value(m, 'content') or ''}" for m in messages)
+        if previous_summary:
+            transcript = f"Earlier summary: {previous_summary}\n{transcript}"
+
+        response = await client.chat.completions.create(
+            model=model,
+            messages=[
+                {'role': 'system', 'content': 'Summarize the following conversation in a few sentences. Keep names, numbers and decisions.'},
+                {'role': 'user', 'content': transcript}
+            ])
+        return response.choices[0].message.content
+    return summarize
+
+class ChatHistory(list):
+    SUMMARY_PREFIX = 'Summary of the earlier conversation: '
+
+    def __init__(self, messages=None, max_tokens=None, summarizer=None, token_counter=None, message_factory=None, history_file=None):
+        super().__init__()
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.token_counter = token_counter or count_message_tokens
+        self.message_factory = message_factory or (lambda role, content: {'role': role, 'content': content})
+        self.token_counts = []
+        self.total_tokens = 0
+        self.summary = None
+        self.history_file = None
+
+        # Resume the conversation saved in the history file (without writing it again), or start a new one in it
+        resumed = history_file.resume_messages(max_tokens, self.token_counter) if history_file is not None else None
+        self.extend(resumed or [])
+        self.history_file = history_file
+        if not resumed:
+            self.extend(messages or [])
+
+    def append(self, message):
+        count = self.token_counter(message)
+        super().append(message)
+        self.token_counts.append(count)
+        self.total_tokens += count
+        if self.history_file is not None:
+            self.history_file.append(message)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+        return self
+
+    def __iadd__(self, messages):
+        return self.extend(messages)
+
+    def insert(self, index, message):
+        count = self.token_counter(message)
+        super().insert(index, message)
+        self.token_counts.insert(index, count)
+        self.total_tokens += count
+
+    def pop(self, index=-1):
+        message = super().pop(index)
+        self.total_tokens -= self.token_counts.pop(index)
+        return message
+
+    def remove(self, message):
+        self.pop(self.index(message))
+
+    def clear(self):
+        super().clear()
+        self.token_counts.clear()
+        self.total_tokens = 0
+        self.summary = None
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self.recount()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        del self.token_counts[index]
+        self.total_tokens = sum(self.token_counts)
+
+    def recount(self):
+        self.token_counts = [self.token_counter(message) for message in self]
+        self.total_tokens = sum(self.token_counts)
+
+    def trim(self):
+        # The summary takes up room too, so if adding it goes over the budget again, more turns are folded into it
+        evicted = []
+        while True:
+            turns = self.evict()
+            evicted.extend(turns)
+            if not turns or self.summarizer is None:
+                return evicted
+            self.summarize(turns)
+
+    async def trim_async(self):
+        evicted = []
+        while True:
+            turns = self.evict()
+            evicted.extend(turns)
+            if not turns or self.summarizer is None:
+                return evicted
+            await self.summarize_async(turns)
+
+    def evict(self):
+        # Removes the oldest whole turns until the history fits, always keeping the latest one
+        if self.max_tokens is None or self.total_tokens <= self.max_tokens:
+            return []
+
+        start = self.pinned_count()
+        evicted = []
+        while self.total_tokens > self.max_tokens:
+            end = self.turn_end(start)
+            if end >= len(self):
+                break
+
+            evicted.extend(self[start:end])
+            del self[start:end]
+        return evicted
+
+    def summarize(self, evicted):
+        self.set_summary(self.summarizer(evicted, self.summary))
+
+    async def summarize_async(self, evicted):
+        # A sync summarizer makes a blocking request, so it runs on a thread rather than on the event loop
+        if inspect.iscoroutinefunction(self.summarizer):
+            summary = await self.summarizer(evicted, self.summary)
+        else:
+            summary = await asyncio.to_thread(self.summarizer, evicted, self.summary)
+        self.set_summary(summary)
+
+    def set_summary(self, summary):
+        self.summary = summary
+        message = self.message_factory('system', f'{self.SUMMARY_PREFIX}{self.summary}')
+
+        position = self.system_count()
+        if self.is_summary(position):
+            self[position] = message
+        else:
+            self.insert(position, message)
+
+    def system_count(self):
+        count = 0
+        while count < len(self) and get_message_value(self[count], 'role') == 'system' and not self.is_summary(count):
+            count += 1
+        return count
+
+    def pinned_count(self):
+        count = self.system_count()
+        return count + 1 if self.is_summary(count) else count
+
+    def is_summary(self, index):
+        if index >= len(self):
+            return False
+        content = get_message_value(self[index], 'content')
+        return get_message_value(self[index], 'role') == 'system' and isinstance(content, str) and content.startswith(self.SUMMARY_PREFIX)
+
+    def turn_end(self, start):
+        # A turn runs from one user message up to the next, so function/tool
+        # calls always leave together with their results
+        end = start + 1
+        while end < len(self) and get_message_value(self[end], 'role') != 'user':
+            end += 1
+        return end
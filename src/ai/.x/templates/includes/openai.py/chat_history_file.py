@@ -0,0 +1,108 @@
+import json
+import mmap
+import os
+from chat_history import count_message_tokens
+
+# Same shape as `ai chat --input-chat-history`/`--output-chat-history`: UTF-8 with a BOM, one message per line,
+# where a system message starts a new conversation
+SYSTEM_ROLE_MARKER = b'"role":"system"'
+
+def to_json_line(message):
+    if not isinstance(message, dict):
+        message = message.model_dump(exclude_none=True) if hasattr(message, 'model_dump') else dict(message)
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+def parse_line(line):
+    try:
+        message = json.loads(line.decode('utf-8-sig'))
+    except ValueError:
+        return None # a line cut short by a crash
+    return message if isinstance(message, dict) and 'role' in message else None
+
+def iter_lines_backwards(view):
+    end = len(view)
+    while end > 0:
+        start = view.rfind(b'\n', 0, end - 1) + 1
+        line = view[start:end].strip()
+        if line:
+            yield line
+        end = start
+
+def read_chat_history(file_name, max_tokens=None, token_counter=count_message_tokens):
+    if not os.path.exists(file_name) or os.path.getsize(file_name) == 0:
+        return []
+
+    # Walk the file backwards through a memory map, so resuming only touches the current
+    # conversation (or just the part that fits max_tokens) however long the file has grown
+    with open(file_name, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        messages = []
+        tokens = 0
+        system_message = None
+        truncated = False
+        for line in iter_lines_backwards(view):
+            if truncated and SYSTEM_ROLE_MARKER not in line:
+                continue # only looking for the system message now; skip parsing
+
+            message = parse_line(line)
+            if message is None:
+                continue
+            if message['role'] == 'system':
+                system_message = message
+                break
+            if truncated:
+                continue
+
+            tokens += token_counter(message)
+            if max_tokens is not None and tokens > max_tokens:
+                truncated = True
+                continue
+            messages.append(message)
+
+    messages.reverse()
+    if truncated:
+        # Start at a user message, so function/tool results never lose their calls
+        while messages and messages[0]['role'] != 'user':
+            messages.pop(0)
+    return ([system_message] if system_message is not None else []) + messages
+
+class ChatHistoryFile:
+    def __init__(self, file_name, durable=False):
+        self.file_name = file_name
+        self.durable = durable
+        self.file = None
+        self.resumed = False
+
+    def resume_messages(self, max_tokens=None, token_counter=count_message_tokens):
+        # The saved conversation is handed out once, to the first history created on this file;
+        # later ones (clear_conversation) start a new conversation in the same file
+        if self.resumed:
+            return None
+        self.resumed = True
+        return read_chat_history(self.file_name, max_tokens, token_counter) or None
+
+    def open(self):
+        is_new = not os.path.exists(self.file_name) or os.path.getsize(self.file_name) == 0
+        needs_newline = False
+        if not is_new:
+            with open(self.file_name, 'rb') as file:
+                file.seek(-1, os.SEEK_END)
+                needs_newline = file.read(1) != b'\n'
+
+        self.file = open(self.file_name, 'a', encoding='utf-8', newline='\n')
+        if is_new:
+            self.file.write('\ufeff')
+        elif needs_newline:
+            self.file.write('\n') # keep a partial line from a crash from swallowing the next message
+
+    def append(self, message):
+        if self.file is None:
+            self.open()
+        self.file.write(to_json_line(message))
+        self.file.flush()
+        if self.durable:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
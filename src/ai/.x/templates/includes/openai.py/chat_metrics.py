@@ -0,0 +1,189 @@
+import threading
+import time
+from bisect import bisect_left
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Upper bounds, in seconds, of the histogram buckets for time-to-first-token and inter-chunk gaps
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def as_dict(self):
+        return {'buckets': list(self.buckets), 'counts': list(self.counts), 'sum': self.sum, 'count': self.count}
+
+class TurnMetrics:
+    def __init__(self, deployment):
+        self.deployment = deployment
+        self.request_start = time.perf_counter()
+        self.first_delta = None
+        self.last_delta = None
+        self.end = None
+        self.requests = 0
+        self.chunks = 0
+        self.gaps = Histogram()
+        self.finish_reason = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.function_calls = 0
+        self.function_seconds = 0.0
+
+    def on_request(self):
+        self.requests += 1
+
+    def on_chunk(self, chunk):
+        choices = getattr(chunk, 'choices', None)
+        choice0 = choices[0] if choices else None
+        delta = getattr(choice0, 'delta', None)
+
+        # Only chunks that carry generated output count; prompt filter results and role-only chunks don't
+        if delta is not None and (getattr(delta, 'content', None) or getattr(delta, 'function_call', None) or getattr(delta, 'tool_calls', None)):
+            now = time.perf_counter()
+            if self.last_delta is None:
+                self.first_delta = now
+            else:
+                self.gaps.observe(now - self.last_delta)
+            self.last_delta = now
+            self.chunks += 1
+
+        finish_reason = getattr(choice0, 'finish_reason', None)
+        if finish_reason is not None:
+            self.finish_reason = finish_reason
+
+        usage = getattr(chunk, 'usage', None)
+        if usage is not None:
+            self.prompt_tokens += getattr(usage, 'prompt_tokens', 0) or 0
+            self.completion_tokens += getattr(usage, 'completion_tokens', 0) or 0
+
+    def on_function_call(self, seconds):
+        self.function_calls += 1
+        self.function_seconds += seconds
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def time_to_first_token(self):
+        return self.first_delta - self.request_start if self.first_delta is not None else None
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.request_start
+
+    def as_dict(self):
+        generation = (self.last_delta - self.first_delta) if self.first_delta is not None else 0
+        return {
+            'deployment': self.deployment,
+            'time_to_first_token': self.time_to_first_token,
+            'duration': self.duration,
+            'requests': self.requests,
+            'chunks': self.chunks,
+            'chunks_per_second': (self.chunks - 1) / generation if generation > 0 else None,
+            'gaps': self.gaps.as_dict(),
+            'finish_reason': self.finish_reason,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'function_calls': self.function_calls,
+            'function_seconds': self.function_seconds,
+        }
+
+class ChatMetrics:
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.turns = {}
+        self.time_to_first_token = Histogram()
+        self.gaps = Histogram()
+        self.duration_sum = 0.0
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.function_calls = 0
+        self.function_seconds = 0.0
+        self.server = None
+
+    def start_turn(self, deployment):
+        return TurnMetrics(deployment)
+
+    def end_turn(self, turn):
+        turn.finish()
+        with self.lock:
+            key = (turn.deployment, turn.finish_reason or 'none')
+            self.turns[key] = self.turns.get(key, 0) + 1
+            if turn.time_to_first_token is not None:
+                self.time_to_first_token.observe(turn.time_to_first_token)
+            self.gaps.merge(turn.gaps)
+            self.duration_sum += turn.duration
+            self.requests += turn.requests
+            self.prompt_tokens += turn.prompt_tokens
+            self.completion_tokens += turn.completion_tokens
+            self.function_calls += turn.function_calls
+            self.function_seconds += turn.function_seconds
+
+        if self.callback is not None:
+            self.callback(turn.as_dict())
+
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            lines.append('# TYPE chat_turns_total counter')
+            for (deployment_name, finish_reason), count in sorted(self.turns.items()):
+                lines.append(f'chat_turns_total{{deployment="{deployment_name}",finish_reason="{finish_reason}"}} {count}')
+
+            self.append_histogram(lines, 'chat_time_to_first_token_seconds', self.time_to_first_token)
+            self.append_histogram(lines, 'chat_inter_chunk_gap_seconds', self.gaps)
+
+            for metric, kind, value in [
+                ('chat_turn_duration_seconds_sum', 'counter', self.duration_sum),
+                ('chat_requests_total', 'counter', self.requests),
+                ('chat_prompt_tokens_total', 'counter', self.prompt_tokens),
+                ('chat_completion_tokens_total', 'counter', self.completion_tokens),
+                ('chat_function_calls_total', 'counter', self.function_calls),
+                ('chat_function_call_seconds_sum', 'counter', self.function_seconds)]:
+                lines.append(f'# TYPE {metric} {kind}')
+                lines.append(f'{metric} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def append_histogram(self, lines, metric, histogram):
+        lines.append(f'# TYPE {metric} histogram')
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+        lines.append(f'{metric}_sum {histogram.sum}')
+        lines.append(f'{metric}_count {histogram.count}')
+
+    def serve_prometheus(self, port=9464, host='127.0.0.1'):
+        metrics = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                payload = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
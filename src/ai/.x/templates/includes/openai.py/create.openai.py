@@ -73,7 +73,8 @@
         api_key = AZURE_OPENAI_API_KEY,
         base_url = AZURE_OPENAI_BASE_URL,
         default_query= { 'api-version': AZURE_OPENAI_API_VERSION },
-        default_headers = { 'api-key': AZURE_OPENAI_API_KEY }
+        default_headers = { 'api-key': AZURE_OPENAI_API_KEY },
+        http_client = get_http_client()
     )
     {{else}}
     # Get the access token using the DefaultAzureCredential
@@ -125,6 +126,7 @@
     print('Using OpenAI...');
     openai = OpenAI(
         api_key=OPENAI_API_KEY,
-        organization=OPENAI_ORG_ID
+        organization=OPENAI_ORG_ID,
+        http_client=get_http_client()
     )
 {{endif}}
\ No newline at end of file
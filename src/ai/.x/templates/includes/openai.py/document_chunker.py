@@ -0,0 +1,158 @@
+import json
+import mmap
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from chat_history import count_text_tokens
+
+# Files are scanned as bytes straight off a memory map, so a large file is never read into one string, and
+# every chunk keeps the exact byte span (start, end) it came from. Only the pieces being measured are decoded.
+
+# A blank line, or the start of a markdown heading, ends a block
+BLOCK_BOUNDARY = re.compile(rb'\n[ \t]*\r?\n|\n(?=#{1,6}[ \t])')
+HEADING = re.compile(rb'#{1,6}[ \t]+([^\r\n]*)')
+SENTENCE_BOUNDARY = re.compile(rb'(?<=[.!?])\s+')
+WORD = re.compile(rb'\S+')
+BOM = b'\xef\xbb\xbf'
+
+TEXT_EXTENSIONS = ('.md', '.markdown', '.txt', '.rst', '.html', '.htm')
+
+def iter_source_files(source_dir, extensions=TEXT_EXTENSIONS):
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(extensions):
+                yield os.path.join(root, name)
+
+def decode(data):
+    return data.decode('utf-8', errors='replace')
+
+def count_tokens(data, start, end):
+    return count_text_tokens(decode(data[start:end]))
+
+def iter_spans(data, start, end, separator):
+    position = start
+    for match in separator.finditer(data, start, end):
+        yield position, match.start()
+        position = match.end()
+    yield position, end
+
+def iter_blocks(data):
+    # Yields the (start, end) of each non-blank paragraph, heading or other block
+    start = len(BOM) if data[:len(BOM)] == BOM else 0
+    for block_start, block_end in iter_spans(data, start, len(data), BLOCK_BOUNDARY):
+        block = data[block_start:block_end]
+        stripped = block.strip()
+        if stripped:
+            block_start += len(block) - len(block.lstrip())
+            yield block_start, block_start + len(stripped)
+
+def split_block(data, start, end, target_tokens):
+    # Returns (start, end, tokens) units of at most target_tokens: the whole block, else its sentences, else runs of words
+    tokens = count_tokens(data, start, end)
+    if tokens <= target_tokens:
+        return [(start, end, tokens)]
+
+    units = []
+    for sentence_start, sentence_end in iter_spans(data, start, end, SENTENCE_BOUNDARY):
+        tokens = count_tokens(data, sentence_start, sentence_end)
+        if tokens <= target_tokens:
+            units.append((sentence_start, sentence_end, tokens))
+            continue
+
+        run_start, run_end, run_tokens = None, None, 0
+        for match in WORD.finditer(data, sentence_start, sentence_end):
+            word_tokens = count_text_tokens(decode(match.group()))
+            if run_start is not None and run_tokens + word_tokens > target_tokens:
+                units.append((run_start, run_end, run_tokens))
+                run_start, run_tokens = None, 0
+            if run_start is None:
+                run_start = match.start()
+            run_end = match.end()
+            run_tokens += word_tokens
+        if run_start is not None:
+            units.append((run_start, run_end, run_tokens))
+    return units
+
+def iter_chunks(data, target_tokens=512, overlap_tokens=64):
+    heading = None
+    units, tokens = [], 0
+
+    def make_chunk():
+        chunk = {'content': decode(data[units[0][0]:units[-1][1]]), 'start': units[0][0], 'end': units[-1][1]}
+        if heading is not None:
+            chunk['heading'] = heading
+        return chunk
+
+    for block_start, block_end in iter_blocks(data):
+        match = HEADING.match(data, block_start, block_end)
+        if match is not None:
+            # A new section always starts a new chunk, without overlap from the previous section
+            if units:
+                yield make_chunk()
+                units, tokens = [], 0
+            heading = decode(match.group(1)).strip()
+
+        for unit in split_block(data, block_start, block_end, target_tokens):
+            if units and tokens + unit[2] > target_tokens:
+                yield make_chunk()
+
+                # Start the next chunk with the tail of this one, up to overlap_tokens
+                overlap, overlap_size = [], 0
+                for previous in reversed(units[1:]):
+                    if overlap_size + previous[2] > overlap_tokens:
+                        break
+                    overlap.insert(0, previous)
+                    overlap_size += previous[2]
+                units, tokens = overlap, overlap_size
+
+            units.append(unit)
+            tokens += unit[2]
+
+    if units:
+        yield make_chunk()
+
+def chunk_file(file_name, target_tokens=512, overlap_tokens=64):
+    if os.path.getsize(file_name) == 0:
+        return [] # mmap can't map an empty file
+
+    with open(file_name, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return list(iter_chunks(data, target_tokens, overlap_tokens))
+
+def iter_chunked_files(items, chunker=chunk_file, processes=None, ahead=None):
+    # Yields (item, chunks) in order for items whose first element is a file name, chunking ahead in a process pool
+    if processes == 1:
+        for item in items:
+            yield item, chunker(item[0])
+        return
+
+    processes = processes or os.cpu_count() or 1
+    ahead = ahead or processes * 4
+    with ProcessPoolExecutor(processes) as executor:
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(chunker, item[0])))
+            if len(pending) >= ahead:
+                item, future = pending.popleft()
+                yield item, future.result()
+
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+def write_chunks(file_names, output_file, chunker=chunk_file, processes=None, root_dir=None):
+    # Writes one JSON line per chunk, e.g. to upload into an AI Search index
+    count = 0
+    with open(output_file, 'w', encoding='utf-8') as output:
+        for (file_name,), chunks in iter_chunked_files(((file_name,) for file_name in file_names), chunker, processes):
+            filepath = os.path.relpath(file_name, root_dir).replace(os.sep, '/') if root_dir else file_name
+            for chunk_id, chunk in enumerate(chunks):
+                output.write(json.dumps({'filepath': filepath, 'chunk_id': chunk_id, **chunk}, ensure_ascii=False) + '\n')
+                count += 1
+    return count
+
+def run_chunking(source_dir, output_file, processes=None):
+    count = write_chunks(iter_source_files(source_dir), output_file, processes=processes, root_dir=source_dir)
+    print('Chunking done: %d chunks written to %s' % (count, output_file))
+    return count
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from openai import AzureOpenAI
+from chat_history import count_text_tokens
+from document_chunker import TEXT_EXTENSIONS, chunk_file, iter_chunked_files, iter_source_files
+from http_clients import get_http_client
+from local_vector_index import LocalVectorIndex
+from rate_limiter import get_rate_limiter
+
+# One JSON line per file each time it is ingested (or removed); the last line for a path wins. A file
+# is only logged once all of its chunks are in the index, so an interrupted run redoes just that file.
+FILES_LOG = 'files.jsonl'
+
+def hash_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def hash_file(file_name):
+    sha256 = hashlib.sha256()
+    with open(file_name, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def read_files_log(file_name):
+    files = {}
+    if not os.path.exists(file_name):
+        return files
+
+    with open(file_name, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue # a partially written line from a crash
+            if entry.get('deleted'):
+                files.pop(entry['filepath'], None)
+            else:
+                files[entry['filepath']] = entry
+    return files
+
+class FileState:
+    def __init__(self, filepath, stat, sha256, old_rows):
+        self.filepath = filepath
+        self.stat = stat
+        self.sha256 = sha256
+        self.old_rows = old_rows
+        self.reused_records = []
+        self.reused_rows = []
+        self.outstanding = 0
+        self.chunks = 0
+        self.chunked = False
+
+class EmbeddingIngestion:
+    def __init__(self, client, deployment_name, index, rate_limiter=None, batch_size=256, max_batch_tokens=100000, concurrency=4, extensions=TEXT_EXTENSIONS, chunker=chunk_file, processes=None):
+        self.client = client
+        self.deployment_name = deployment_name
+        self.index = LocalVectorIndex(index) if isinstance(index, str) else index
+        self.rate_limiter = rate_limiter
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.concurrency = concurrency
+        self.extensions = extensions
+        self.chunker = chunker
+        self.processes = processes
+        self.counts = {'files': 0, 'unchanged': 0, 'removed': 0, 'chunks': 0, 'embedded': 0, 'reused': 0}
+
+    def embed(self, inputs):
+        if self.rate_limiter is None:
+            response = self.client.embeddings.create(model=self.deployment_name, input=inputs)
+        else:
+            # The limiter does its own throttling and retries, so the SDK's are turned off
+            response = self.rate_limiter.call(self.client.with_options(max_retries=0).embeddings, model=self.deployment_name, input=inputs)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def run(self, source_dir):
+        files_log = os.path.join(self.index.directory, FILES_LOG)
+        files = read_files_log(files_log)
+
+        # Rows already in the index, by file (to supersede when the file changes) and by content (to reuse their vectors)
+        rows_by_file, self.rows_by_hash = {}, {}
+        live = self.index.get_live()
+        for row_id, record in enumerate(self.index.metadata):
+            if live[row_id]:
+                rows_by_file.setdefault(record.get('filepath'), []).append(row_id)
+                self.rows_by_hash[record.get('content_hash')] = row_id
+
+        self.pending = {}
+        self.batch, self.batch_tokens = [], 0
+        seen = set()
+        with open(files_log, 'a', encoding='utf-8') as self.log, ThreadPoolExecutor(self.concurrency) as self.executor:
+            changed_files = self.iter_changed_files(source_dir, files, seen)
+            for (file_name, filepath, stat, sha256), chunks in iter_chunked_files(changed_files, self.chunker, self.processes):
+                state = FileState(filepath, stat, sha256, rows_by_file.get(filepath, []))
+                for chunk_id, record in enumerate(chunks):
+                    self.add_chunk(state, {**record, 'title': os.path.basename(file_name), 'filepath': filepath, 'chunk_id': chunk_id, 'content_hash': hash_text(record['content'])})
+                state.chunked = True
+                if state.outstanding == 0:
+                    self.finish_file(state)
+
+            self.submit_batch()
+            while self.pending:
+                self.wait_for_batches(FIRST_COMPLETED)
+
+        # Files that are gone from the source directory
+        removed = [filepath for filepath in set(files) | set(rows_by_file) if filepath is not None and filepath not in seen]
+        with open(files_log, 'a', encoding='utf-8') as self.log:
+            for filepath in removed:
+                self.index.delete(rows_by_file.get(filepath, []))
+                self.write_log({'filepath': filepath, 'deleted': True})
+                self.counts['removed'] += 1
+
+        return self.counts
+
+    def iter_changed_files(self, source_dir, files, seen):
+        for file_name in iter_source_files(source_dir, self.extensions):
+            filepath = os.path.relpath(file_name, source_dir).replace(os.sep, '/')
+            seen.add(filepath)
+
+            stat = os.stat(file_name)
+            entry = files.get(filepath)
+            if entry is not None and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                self.counts['unchanged'] += 1
+                continue
+
+            sha256 = hash_file(file_name)
+            if entry is not None and entry['sha256'] == sha256:
+                self.write_log({**entry, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size})
+                self.counts['unchanged'] += 1
+                continue
+
+            yield file_name, filepath, stat, sha256
+
+    def add_chunk(self, state, record):
+        state.chunks += 1
+        self.counts['chunks'] += 1
+
+        row_id = self.rows_by_hash.get(record['content_hash'])
+        if row_id is not None:
+            state.reused_records.append(record)
+            state.reused_rows.append(row_id)
+            return
+
+        tokens = count_text_tokens(record['content'])
+        if self.batch and (len(self.batch) >= self.batch_size or self.batch_tokens + tokens > self.max_batch_tokens):
+            self.submit_batch()
+
+        if not self.batch or self.batch[-1][0] is not state:
+            state.outstanding += 1
+        self.batch.append((state, record))
+        self.batch_tokens += tokens
+
+    def submit_batch(self):
+        if not self.batch:
+            return
+        # Keep a couple of batches queued per worker, and no more, so memory stays flat however big the corpus is
+        while len(self.pending) >= self.concurrency * 2:
+            self.wait_for_batches(FIRST_COMPLETED)
+
+        future = self.executor.submit(self.embed, [record['content'] for _, record in self.batch])
+        self.pending[future] = self.batch
+        self.batch, self.batch_tokens = [], 0
+
+    def wait_for_batches(self, return_when):
+        done, _ = wait(self.pending, return_when=return_when)
+        for future in done:
+            batch = self.pending.pop(future)
+            vectors = future.result()
+
+            start = self.index.count
+            self.index.add([record for _, record in batch], vectors)
+            self.counts['embedded'] += len(batch)
+            for row_id, (_, record) in enumerate(batch, start):
+                self.rows_by_hash[record['content_hash']] = row_id
+
+            for state in {id(state): state for state, _ in batch}.values():
+                state.outstanding -= 1
+                if state.outstanding == 0 and state.chunked:
+                    self.finish_file(state)
+
+    def finish_file(self, state):
+        if state.reused_rows:
+            self.index.add(state.reused_records, np.array(self.index.get_vectors()[state.reused_rows]))
+            self.counts['reused'] += len(state.reused_rows)
+
+        # The new rows are in, so the file's old ones can go
+        self.index.delete(state.old_rows)
+        self.write_log({'filepath': state.filepath, 'mtime_ns': state.stat.st_mtime_ns, 'size': state.stat.st_size, 'sha256': state.sha256, 'chunks': state.chunks})
+        self.counts['files'] += 1
+
+    def write_log(self, entry):
+        self.log.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.log.flush()
+
+def run_ingestion(openai_api_version, openai_endpoint, openai_key, openai_embeddings_deployment_name, source_dir, index_dir, concurrency=4):
+    client = AzureOpenAI(
+        api_key=openai_key,
+        api_version=openai_api_version,
+        azure_endpoint = openai_endpoint,
+        http_client = get_http_client()
+        )
+
+    start = time.perf_counter()
+    ingestion = EmbeddingIngestion(client, openai_embeddings_deployment_name, index_dir, rate_limiter=get_rate_limiter(openai_embeddings_deployment_name), concurrency=concurrency)
+    counts = ingestion.run(source_dir)
+    print(f"Ingestion done in {time.perf_counter() - start:.1f}s: {counts['files']} files indexed, {counts['unchanged']} unchanged, {counts['removed']} removed; "
+          f"{counts['chunks']} chunks, {counts['embedded']} embedded, {counts['reused']} reused")
+    return counts
@@ -0,0 +1,173 @@
+import random
+import threading
+import time
+from openai import AzureOpenAI, APIConnectionError, APIStatusError, APITimeoutError
+from http_clients import get_http_client
+from raw_sse import create_raw_stream, iter_raw_chunks
+
+FAILOVER_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+class Endpoint:
+    def __init__(self, openai_endpoint, openai_key, openai_chat_deployment_name, rate_limiter=None):
+        self.openai_endpoint = openai_endpoint
+        self.openai_key = openai_key
+        self.openai_chat_deployment_name = openai_chat_deployment_name
+        self.rate_limiter = rate_limiter
+        self.client = None
+        self.outstanding = 0
+        self.latency = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def create_client(self, openai_api_version, http_client=None):
+        # Retries go to another endpoint (pool failover, hedging) rather than back to this one
+        self.client = AzureOpenAI(
+            api_key=self.openai_key,
+            api_version=openai_api_version,
+            azure_endpoint=self.openai_endpoint,
+            http_client=http_client or get_http_client(),
+            max_retries=0)
+
+    def create_chat_completion(self, raw_stream=False, rate_limiter=None, **request):
+        # rate_limiter: used when this endpoint has none of its own
+        request['model'] = self.openai_chat_deployment_name
+        rate_limiter = self.rate_limiter or rate_limiter
+        if rate_limiter is None:
+            return create_raw_stream(self.client.chat.completions, **request) if raw_stream else self.client.chat.completions.create(**request)
+        return rate_limiter.call(self.client.chat.completions, parse=iter_raw_chunks if raw_stream else None, **request)
+
+class EndpointPool:
+    def __init__(self, endpoints, openai_api_version, strategy='least_outstanding', max_failures=3, ejection_seconds=30.0, latency_decay=0.3, http_client=None):
+        if strategy not in ('least_outstanding', 'latency'):
+            raise ValueError("Unknown strategy %r; use 'least_outstanding' or 'latency'" % strategy)
+
+        self.endpoints = [endpoint if isinstance(endpoint, Endpoint) else Endpoint(*endpoint) for endpoint in endpoints]
+        self.strategy = strategy
+        self.max_failures = max_failures
+        self.ejection_seconds = ejection_seconds
+        self.latency_decay = latency_decay
+        self.lock = threading.Lock()
+
+        for endpoint in self.endpoints:
+            endpoint.create_client(openai_api_version, http_client)
+
+    def choose(self, exclude=()):
+        with self.lock:
+            now = time.monotonic()
+            candidates = [e for e in self.endpoints if e not in exclude and e.ejected_until <= now]
+            if not candidates:
+                # Everything is ejected; try whichever endpoint comes back first rather than failing outright
+                candidates = sorted((e for e in self.endpoints if e not in exclude), key=lambda e: e.ejected_until)[:1]
+            if not candidates:
+                return None
+
+            if self.strategy == 'latency':
+                # Unmeasured endpoints score zero, so each one gets tried early on
+                score = lambda e: (e.latency or 0.0) * (e.outstanding + 1)
+            else:
+                score = lambda e: e.outstanding
+            best = min(score(e) for e in candidates)
+            endpoint = random.choice([e for e in candidates if score(e) == best])
+
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def on_first_chunk(self, endpoint, latency):
+        with self.lock:
+            endpoint.latency = latency if endpoint.latency is None else (1 - self.latency_decay) * endpoint.latency + self.latency_decay * latency
+
+    def on_success(self, endpoint):
+        with self.lock:
+            endpoint.outstanding -= 1
+            endpoint.consecutive_failures = 0
+
+    def on_failure(self, endpoint):
+        with self.lock:
+            endpoint.outstanding -= 1
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.max_failures:
+                endpoint.ejected_until = time.monotonic() + self.ejection_seconds
+
+    def create_chat_completion(self, raw_stream=False, rate_limiter=None, **request):
+        tried = []
+        while True:
+            endpoint = self.choose(exclude=tried)
+            start = time.perf_counter()
+            try:
+                response = endpoint.create_chat_completion(raw_stream, rate_limiter, **request)
+            except Exception as e:
+                if not is_failover_error(e):
+                    self.on_success(endpoint) # the request was bad, not the endpoint
+                    raise
+                self.on_failure(endpoint)
+                tried.append(endpoint)
+                if len(tried) == len(self.endpoints):
+                    raise
+                continue
+
+            return TrackedStream(self, endpoint, response, start)
+
+    def stats(self):
+        with self.lock:
+            now = time.monotonic()
+            return [{
+                'endpoint': e.openai_endpoint,
+                'deployment': e.openai_chat_deployment_name,
+                'outstanding': e.outstanding,
+                'latency': e.latency,
+                'requests': e.requests,
+                'failures': e.failures,
+                'ejected': e.ejected_until > now,
+            } for e in self.endpoints]
+
+class TrackedStream:
+    # Keeps the request outstanding until the stream is drained, closed or dropped, and times its first chunk.
+    # The endpoint is settled exactly once, even for a stream that is never iterated.
+    def __init__(self, pool, endpoint, response, start):
+        self.pool = pool
+        self.endpoint = endpoint
+        self.response = response
+        self.start = start
+        self.settled = False
+        self.lock = threading.Lock()
+
+    def __iter__(self):
+        first = True
+        try:
+            for chunk in self.response:
+                if first:
+                    self.pool.on_first_chunk(self.endpoint, time.perf_counter() - self.start)
+                    first = False
+                yield chunk
+        except GeneratorExit:
+            self.close() # the caller stopped reading early; that says nothing about the endpoint
+            raise
+        except Exception:
+            self.settle(self.pool.on_failure)
+            raise
+        self.settle(self.pool.on_success)
+
+    def settle(self, outcome):
+        with self.lock:
+            if self.settled:
+                return
+            self.settled = True
+        outcome(self.endpoint)
+
+    def close(self):
+        try:
+            self.response.close()
+        finally:
+            self.settle(self.pool.on_success)
+
+    def __del__(self):
+        self.settle(self.pool.on_success)
+
+def is_failover_error(error):
+    if isinstance(error, (APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in FAILOVER_STATUS_CODES
@@ -0,0 +1,19 @@
+# Read-only JSON values, for payloads that are built once and shared by every request (function schemas,
+# tools). A caller that tries to change one gets an error rather than quietly changing what all later
+# requests send. They are still dicts and tuples, so json and the SDK serialize them as usual.
+
+class FrozenDict(dict):
+    def read_only(self, *args, **kwargs):
+        raise TypeError('this %s is shared and read-only; copy it to change it' % type(self).__name__)
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = read_only
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+def freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from response_cache import ResponseCache
+
+class CachePolicy:
+    def __init__(self, pure=False, ttl_seconds=None, max_entries=None, key_fields=None):
+        # pure: the result depends only on the arguments, so it is kept for the cache's full lifetime;
+        # otherwise a result is only reused for ttl_seconds (and without one, or with 0, not at all).
+        # key_fields: the arguments that matter for the result; by default, all of them.
+        self.pure = pure
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.key_fields = key_fields
+
+    @property
+    def cacheable(self):
+        return self.pure or (self.ttl_seconds is not None and self.ttl_seconds > 0)
+
+def get_function_identity(func):
+    # Functions registered under the same name by different factories or modules must not share results,
+    # so entries are keyed by where the function is defined as well as by its name
+    code = getattr(func, '__code__', None)
+    location = '%s:%d' % (code.co_filename, code.co_firstlineno) if code is not None else ''
+    qualname = getattr(func, '__qualname__', None) or type(func).__qualname__
+    return '%s.%s@%s' % (getattr(func, '__module__', None), qualname, location)
+
+def get_cache_policy(cache):
+    if cache is None or isinstance(cache, CachePolicy):
+        return cache
+    return CachePolicy(**cache)
+
+class FunctionResultCache:
+    # Function results, in an in-memory LRU with an optional disk tier (directory) shared across processes and sessions
+    def __init__(self, directory=None, max_memory_entries=4096, ttl_seconds=24 * 60 * 60, max_disk_bytes=100 * 1024 * 1024):
+        self.store = ResponseCache(directory, max_memory_entries, ttl_seconds, max_disk_bytes, cache_nondeterministic=True)
+        self.keys_by_function = {}
+        self.lock = threading.Lock()
+
+    def make_key(self, function_name, function_arguments, policy, func=None):
+        arguments = function_arguments
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments) if arguments else {}
+            except ValueError:
+                pass
+        if policy.key_fields is not None and isinstance(arguments, dict):
+            arguments = {field: arguments.get(field) for field in policy.key_fields}
+
+        # Canonical JSON, so the same arguments in another order or spacing hit the same entry
+        identity = get_function_identity(func) if func is not None else None
+        text = json.dumps([function_name, identity, arguments], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def put(self, function_name, key, result, policy, func=None):
+        try:
+            self.store.put(key, result, policy.ttl_seconds)
+        except (TypeError, ValueError):
+            pass # not JSON serializable, so it stays in memory only
+
+        if policy.max_entries is not None:
+            with self.lock:
+                keys = self.keys_by_function.setdefault((function_name, get_function_identity(func) if func is not None else None), OrderedDict())
+                keys[key] = True
+                keys.move_to_end(key)
+                evicted = [keys.popitem(last=False)[0] for _ in range(len(keys) - policy.max_entries)]
+            for key in evicted:
+                self.store.delete(key)
+
+    def call(self, function_name, function_arguments, policy, func):
+        if not policy.cacheable:
+            return func(function_arguments)
+
+        key = self.make_key(function_name, function_arguments, policy, func)
+        result = self.get(key)
+        if result is None:
+            result = func(function_arguments)
+            if result is not None:
+                self.put(function_name, key, result, policy, func)
+        return result
+
+    async def call_async(self, function_name, function_arguments, policy, func):
+        if not policy.cacheable:
+            return await func(function_arguments)
+
+        key = self.make_key(function_name, function_arguments, policy, func)
+        result = self.get(key)
+        if result is None:
+            result = await func(function_arguments)
+            if result is not None:
+                self.put(function_name, key, result, policy, func)
+        return result
+
+    def stats(self):
+        return {'hits': self.store.hits, 'misses': self.store.misses, 'entries': len(self.store.memory)}
+
+# Used by every FunctionFactory that isn't given its own cache, so all sessions in the process share results
+shared_function_cache = FunctionResultCache()
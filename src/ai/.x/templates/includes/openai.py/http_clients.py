@@ -0,0 +1,75 @@
+import importlib
+import importlib.util
+import os
+import threading
+from openai import DefaultHttpxClient, DefaultAsyncHttpxClient
+
+# Limits come from the HTTP library the SDK's clients are built on (httpx, or httpx2 in newer SDKs),
+# rather than a separately installed one that may be missing or a different version
+http_library = importlib.import_module(DefaultHttpxClient.__mro__[1].__module__.split('.')[0])
+
+# One pool per process (and per settings), shared by every chat, assistants and embeddings client,
+# so TLS handshakes and TCP connections are paid once rather than once per client instance
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_pool_settings(max_connections=None, max_keepalive_connections=None, keepalive_expiry=None, http2=None):
+    if http2 is None:
+        http2 = os.getenv('AZURE_OPENAI_HTTP2', 'auto').lower()
+        http2 = importlib.util.find_spec('h2') is not None if http2 == 'auto' else http2 in ('1', 'true', 'yes')
+    return (
+        max_connections or int(os.getenv('AZURE_OPENAI_HTTP_MAX_CONNECTIONS', 100)),
+        max_keepalive_connections or int(os.getenv('AZURE_OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS', 20)),
+        keepalive_expiry or float(os.getenv('AZURE_OPENAI_HTTP_KEEPALIVE_EXPIRY', 30)),
+        http2)
+
+def get_http_client(max_connections=None, max_keepalive_connections=None, keepalive_expiry=None, http2=None):
+    return _get_client(DefaultHttpxClient, get_pool_settings(max_connections, max_keepalive_connections, keepalive_expiry, http2))
+
+def get_async_http_client(max_connections=None, max_keepalive_connections=None, keepalive_expiry=None, http2=None):
+    return _get_client(DefaultAsyncHttpxClient, get_pool_settings(max_connections, max_keepalive_connections, keepalive_expiry, http2))
+
+def _get_client(client_class, settings):
+    with _clients_lock:
+        key = (client_class, settings)
+        client = _clients.get(key)
+        if client is None or client.is_closed:
+            max_connections, max_keepalive_connections, keepalive_expiry, http2 = settings
+            limits = http_library.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections, keepalive_expiry=keepalive_expiry)
+            client = _clients[key] = client_class(limits=limits, http2=http2)
+            client.pool_settings = settings
+            client.request_count = 0
+            client.event_hooks['request'].append(_count_async_request(client) if client_class is DefaultAsyncHttpxClient else _count_request(client))
+        return client
+
+def _count_request(client):
+    def on_request(request):
+        client.request_count += 1
+    return on_request
+
+def _count_async_request(client):
+    async def on_request(request):
+        client.request_count += 1
+    return on_request
+
+def pool_stats(client):
+    # httpcore keeps its connection list on the transport's pool; it isn't public API, so read it defensively
+    pool = getattr(getattr(client, '_transport', None), '_pool', None)
+    connections = list(getattr(pool, 'connections', []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    max_connections, max_keepalive_connections, keepalive_expiry, http2 = client.pool_settings
+    return {
+        'requests': client.request_count,
+        'connections': len(connections),
+        'active_connections': len(connections) - idle,
+        'idle_connections': idle,
+        'queued_requests': sum(1 for request in getattr(pool, '_requests', []) if request.is_queued()),
+        'max_connections': max_connections,
+        'max_keepalive_connections': max_keepalive_connections,
+        'http2': http2,
+    }
+
+def all_pool_stats():
+    with _clients_lock:
+        clients = list(_clients.values())
+    return [pool_stats(client) for client in clients]
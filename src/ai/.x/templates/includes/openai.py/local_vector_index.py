@@ -0,0 +1,244 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+import numpy as np
+
+# On-disk layout of a local index directory:
+#   manifest.json   dimensions and committed row count (rows past it, e.g. from a crash, are ignored)
+#   vectors.f32     float32 row-major embedding matrix, unit-normalized, appended to and memory-mapped
+#   metadata.jsonl  one JSON object per row: content, title, filepath, url, chunk_id, ...
+#   deleted.i64     int64 ids of rows that were superseded (e.g. their file changed), skipped by search
+#   ivf.npz         optional inverted-file (IVF) clustering for approximate search
+MANIFEST_FILE = 'manifest.json'
+VECTORS_FILE = 'vectors.f32'
+METADATA_FILE = 'metadata.jsonl'
+DELETED_FILE = 'deleted.i64'
+IVF_FILE = 'ivf.npz'
+
+# Rows scored per block in exact search, so the memory map is streamed rather than materialized
+SEARCH_BLOCK_ROWS = 65536
+
+def tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def top_k(scores, ids, k):
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        scores, ids = scores[keep], ids[keep]
+    order = np.argsort(-scores, kind='stable')
+    return scores[order], ids[order]
+
+class BM25:
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        lengths = []
+        for doc_id, document in enumerate(documents):
+            terms = Counter(tokenize(document))
+            lengths.append(sum(terms.values()))
+            for term, count in terms.items():
+                self.postings.setdefault(term, []).append((doc_id, count))
+
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+        self.average_length = float(self.lengths.mean()) if len(lengths) else 0.0
+        self.postings = {term: (np.asarray([d for d, _ in p], dtype=np.int64), np.asarray([c for _, c in p], dtype=np.float32)) for term, p in self.postings.items()}
+
+    def search(self, query, k, live=None):
+        scores = np.zeros(len(self.lengths), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, counts = posting
+            idf = math.log(1 + (len(self.lengths) - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            norm = counts + self.k1 * (1 - self.b + self.b * self.lengths[doc_ids] / max(self.average_length, 1e-9))
+            scores[doc_ids] += idf * counts * (self.k1 + 1) / norm
+
+        if live is not None:
+            scores[~live] = 0
+        matched = np.nonzero(scores)[0]
+        return top_k(scores[matched], matched, k)
+
+class LocalVectorIndex:
+    def __init__(self, directory, dimensions=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        manifest_path = os.path.join(directory, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+        else:
+            manifest = {'dimensions': dimensions, 'count': 0}
+
+        self.dimensions = manifest['dimensions']
+        self.count = manifest['count']
+        self.metadata = self.read_metadata()
+        self.vectors = None
+        self.live = None
+        self.ivf = None
+        self.bm25 = None
+
+    def path(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def read_metadata(self):
+        metadata = []
+        if os.path.exists(self.path(METADATA_FILE)):
+            with open(self.path(METADATA_FILE), 'r', encoding='utf-8') as file:
+                for line in file:
+                    if len(metadata) == self.count:
+                        break
+                    metadata.append(json.loads(line))
+        return metadata
+
+    def write_manifest(self):
+        temp_path = self.path(MANIFEST_FILE + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'dimensions': self.dimensions, 'count': self.count}, file)
+        os.replace(temp_path, self.path(MANIFEST_FILE))
+
+    def get_vectors(self):
+        if self.vectors is None and self.count:
+            self.vectors = np.memmap(self.path(VECTORS_FILE), dtype=np.float32, mode='r', shape=(self.count, self.dimensions))
+        return self.vectors
+
+    def get_live(self):
+        if self.live is None:
+            self.live = np.ones(self.count, dtype=bool)
+            if os.path.exists(self.path(DELETED_FILE)):
+                # Whole ids only, in case the last append was cut short
+                deleted = np.fromfile(self.path(DELETED_FILE), dtype=np.int64, count=os.path.getsize(self.path(DELETED_FILE)) // 8)
+                self.live[deleted[deleted < self.count]] = False
+        return self.live
+
+    def truncate_to_count(self):
+        # Drop anything written after the last committed manifest (an interrupted add)
+        if os.path.exists(self.path(VECTORS_FILE)):
+            with open(self.path(VECTORS_FILE), 'r+b') as file:
+                file.truncate(self.count * (self.dimensions or 0) * 4)
+        with open(self.path(METADATA_FILE), 'w', encoding='utf-8') as file:
+            file.writelines(json.dumps(item, ensure_ascii=False) + '\n' for item in self.metadata)
+
+    def add(self, records, vectors):
+        vectors = normalize_rows(vectors)
+        if len(records) != len(vectors):
+            raise ValueError('Got %d records but %d vectors' % (len(records), len(vectors)))
+        if not len(records):
+            return
+        if self.dimensions is None:
+            self.dimensions = vectors.shape[1]
+        if vectors.shape[1] != self.dimensions:
+            raise ValueError('Expected %d-dimensional vectors, got %d' % (self.dimensions, vectors.shape[1]))
+
+        vectors_size = os.path.getsize(self.path(VECTORS_FILE)) if os.path.exists(self.path(VECTORS_FILE)) else 0
+        if vectors_size != self.count * self.dimensions * 4:
+            self.truncate_to_count()
+
+        with open(self.path(VECTORS_FILE), 'ab') as file:
+            file.write(vectors.tobytes())
+        with open(self.path(METADATA_FILE), 'a', encoding='utf-8') as file:
+            file.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+        self.count += len(records)
+        self.metadata.extend(records)
+        self.write_manifest()
+        self.vectors = None
+        self.live = None
+        self.bm25 = None
+
+    def delete(self, row_ids):
+        row_ids = np.asarray(sorted(row_ids), dtype=np.int64)
+        if not len(row_ids):
+            return
+        with open(self.path(DELETED_FILE), 'ab') as file:
+            file.write(row_ids.tobytes())
+        self.get_live()[row_ids] = False
+
+    def build_ivf(self, lists=None, iterations=10, sample_size=20000, seed=0):
+        vectors = self.get_vectors()
+        if vectors is None:
+            return
+        lists = lists or max(1, int(math.sqrt(self.count)))
+        random = np.random.default_rng(seed)
+
+        # Spherical k-means on a sample, then assign every row to its nearest centroid
+        sample = vectors[np.sort(random.choice(self.count, min(sample_size, self.count), replace=False))]
+        centroids = sample[random.choice(len(sample), min(lists, len(sample)), replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for list_id in range(len(centroids)):
+                members = sample[assignment == list_id]
+                if len(members):
+                    centroids[list_id] = members.mean(axis=0)
+            centroids = normalize_rows(centroids)
+
+        assignment = np.concatenate([np.argmax(vectors[i:i + SEARCH_BLOCK_ROWS] @ centroids.T, axis=1) for i in range(0, self.count, SEARCH_BLOCK_ROWS)])
+        row_ids = np.argsort(assignment, kind='stable').astype(np.int64)
+        offsets = np.searchsorted(assignment[row_ids], np.arange(len(centroids) + 1))
+        np.savez(self.path(IVF_FILE), centroids=centroids, row_ids=row_ids, offsets=offsets, count=self.count)
+        self.ivf = None
+
+    def get_ivf(self):
+        if self.ivf is None and os.path.exists(self.path(IVF_FILE)):
+            with np.load(self.path(IVF_FILE)) as data:
+                self.ivf = {name: data[name] for name in data.files}
+        return self.ivf
+
+    def search_vectors(self, query_vector, k, probes=None):
+        vectors = self.get_vectors()
+        if vectors is None:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        query = normalize_rows(query_vector)
+
+        ivf = self.get_ivf() if probes else None
+        if ivf is not None:
+            # Approximate: score only the rows in the closest clusters, plus rows added since the IVF was built
+            nearest = np.argsort(-(ivf['centroids'] @ query))[:probes]
+            candidates = [ivf['row_ids'][ivf['offsets'][i]:ivf['offsets'][i + 1]] for i in nearest]
+            candidates.append(np.arange(int(ivf['count']), self.count, dtype=np.int64))
+            ids = np.sort(np.concatenate(candidates))
+            ids = ids[self.get_live()[ids]]
+            return top_k(vectors[ids] @ query, ids, k)
+
+        live = self.get_live()
+        best_scores, best_ids = np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        for start in range(0, self.count, SEARCH_BLOCK_ROWS):
+            scores = vectors[start:start + SEARCH_BLOCK_ROWS] @ query
+            scores[~live[start:start + len(scores)]] = -np.inf
+            scores, ids = top_k(scores, np.arange(start, start + len(scores)), k)
+            best_scores, best_ids = top_k(np.concatenate([best_scores, scores]), np.concatenate([best_ids, ids]), k)
+        keep = best_scores > -np.inf
+        return best_scores[keep], best_ids[keep]
+
+    def search_text(self, query_text, k):
+        if self.bm25 is None:
+            self.bm25 = BM25(item.get('content', '') for item in self.metadata)
+        return self.bm25.search(query_text, k, self.get_live())
+
+    def search(self, query_text=None, query_vector=None, k=5, mode='hybrid', probes=None, rrf_k=60):
+        if mode == 'vector' or (mode == 'hybrid' and not query_text):
+            _, ids = self.search_vectors(query_vector, k, probes)
+        elif mode == 'text' or (mode == 'hybrid' and query_vector is None):
+            _, ids = self.search_text(query_text, k)
+        elif mode == 'hybrid':
+            # Reciprocal rank fusion of the vector and BM25 rankings
+            _, vector_ids = self.search_vectors(query_vector, k * 4, probes)
+            _, text_ids = self.search_text(query_text, k * 4)
+            fused = Counter()
+            for ranking in (vector_ids, text_ids):
+                for rank, row_id in enumerate(ranking.tolist()):
+                    fused[row_id] += 1.0 / (rrf_k + rank + 1)
+            ids = [row_id for row_id, _ in fused.most_common(k)]
+        else:
+            raise ValueError("Unknown search mode %r; use 'vector', 'text' or 'hybrid'" % mode)
+
+        return [self.metadata[int(row_id)] for row_id in ids]
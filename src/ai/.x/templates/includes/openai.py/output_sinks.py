@@ -0,0 +1,239 @@
+import sys
+import threading
+import time
+from collections import deque
+
+class StdoutSink:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def write(self, text):
+        self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+class FileSink:
+    def __init__(self, file_name, mode='a', encoding='utf-8'):
+        self.file = open(file_name, mode, encoding=encoding)
+
+    def write(self, text):
+        self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class SocketSink:
+    def __init__(self, sock, encoding='utf-8'):
+        self.sock = sock
+        self.encoding = encoding
+
+    def write(self, text):
+        self.sock.sendall(text.encode(self.encoding))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.sock.close()
+
+class CoalescingOutput:
+    def __init__(self, *sinks, max_delay=0.05, max_chars=1024, flush_on_newline=True):
+        self.sinks = list(sinks) or [StdoutSink()]
+        self.max_delay = max_delay
+        self.max_chars = max_chars
+        self.flush_on_newline = flush_on_newline
+        self.buffer = []
+        self.buffered_chars = 0
+        self.last_flush = time.monotonic()
+        self.condition = threading.Condition(threading.RLock())
+        self.deadline = None
+        self.flusher = None
+        self.closed = False
+
+    def __call__(self, content):
+        self.write(content)
+
+    def write(self, content):
+        if not content:
+            return
+
+        with self.condition:
+            self.buffer.append(content)
+            self.buffered_chars += len(content)
+
+            if self.buffered_chars >= self.max_chars \
+                or (self.flush_on_newline and '\n' in content) \
+                or time.monotonic() - self.last_flush >= self.max_delay:
+                self.flush()
+            elif self.deadline is None:
+                self.start_deadline()
+
+    def start_deadline(self):
+        # Text held back is written once max_delay has passed even if nothing else arrives, e.g. while the
+        # model pauses for a tool call, rather than waiting for the next delta or the end of the turn
+        self.deadline = self.last_flush + self.max_delay
+        if self.flusher is None:
+            self.flusher = threading.Thread(target=self.flush_on_deadline, name='output-flush', daemon=True)
+            self.flusher.start()
+        self.condition.notify_all()
+
+    def flush_on_deadline(self):
+        with self.condition:
+            while not self.closed:
+                if self.deadline is None:
+                    # Lingers a little for the next deadline, then exits until text is held back again
+                    if not self.condition.wait_for(lambda: self.deadline is not None or self.closed, timeout=1.0):
+                        break
+                    continue
+                remaining = self.deadline - time.monotonic()
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                else:
+                    self.flush()
+            self.flusher = None
+
+    def flush(self):
+        with self.condition:
+            self.last_flush = time.monotonic()
+            self.deadline = None
+            if not self.buffer:
+                return
+
+            text = ''.join(self.buffer)
+            self.buffer.clear()
+            self.buffered_chars = 0
+
+            for sink in self.sinks:
+                sink.write(text)
+                sink.flush()
+
+    def close(self):
+        with self.condition:
+            self.flush()
+            self.closed = True
+            self.condition.notify_all()
+        for sink in self.sinks:
+            sink.close()
+
+class ConsumerQueue:
+    POLICIES = ('block', 'drop', 'coalesce')
+
+    def __init__(self, consumer, max_pending=256, policy='block'):
+        if policy not in self.POLICIES:
+            raise ValueError("Unknown policy %r; use 'block', 'drop' or 'coalesce'" % policy)
+
+        self.consumer = consumer
+        self.deliver = consumer if callable(consumer) else consumer.write
+        self.max_pending = max(1, max_pending)
+        self.policy = policy
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.busy = False
+        self.closed = False
+        self.dropped = 0
+        self.coalesced = 0
+        self.result = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def put(self, content):
+        with self.condition:
+            if len(self.pending) >= self.max_pending:
+                if self.policy == 'drop':
+                    self.dropped += 1
+                    return
+                if self.policy == 'coalesce':
+                    self.pending[-1] += content
+                    self.coalesced += 1
+                    return
+                self.condition.wait_for(lambda: len(self.pending) < self.max_pending)
+
+            self.pending.append(content)
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.closed)
+                if not self.pending:
+                    return
+                content = self.pending.popleft()
+                self.busy = True
+                self.condition.notify_all()
+
+            try:
+                result = self.deliver(content)
+                if result is not None and self.result is None:
+                    self.result = result
+            except Exception as e:
+                self.error = self.error or e
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def join(self):
+        with self.condition:
+            self.condition.wait_for(lambda: not self.pending and not self.busy)
+
+    def close(self):
+        self.join()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+class FanOutOutput:
+    # Hands each delta to every consumer through its own bounded queue and thread, so a slow consumer
+    # (TTS, a websocket, logging) never holds up reading the HTTP stream, unless its policy is 'block'
+    def __init__(self, *consumers, max_pending=256, policy='block'):
+        self.queues = [c if isinstance(c, ConsumerQueue) else ConsumerQueue(c, max_pending, policy) for c in consumers]
+
+    def __call__(self, content):
+        self.write(content)
+
+        # Pass on what a consumer returned (e.g. 'stop'), so it can end the answer early
+        for queue in self.queues:
+            if queue.result is not None:
+                return queue.result
+
+    def write(self, content):
+        if not content:
+            return
+        for queue in self.queues:
+            queue.put(content)
+
+    def flush(self):
+        for queue in self.queues:
+            queue.join()
+            flush = getattr(queue.consumer, 'flush', None)
+            if flush is not None:
+                flush()
+
+        errors = [queue.error for queue in self.queues if queue.error is not None]
+        for queue in self.queues:
+            queue.error = None
+            queue.result = None
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            for queue in self.queues:
+                queue.close()
+                close = getattr(queue.consumer, 'close', None)
+                if close is not None:
+                    close()
+
+    def stats(self):
+        return [{'pending': len(queue.pending), 'dropped': queue.dropped, 'coalesced': queue.coalesced, 'policy': queue.policy} for queue in self.queues]
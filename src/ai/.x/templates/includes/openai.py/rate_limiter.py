@@ -0,0 +1,164 @@
+import asyncio
+import random
+import threading
+import time
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+from chat_history import count_message_tokens, count_text_tokens
+
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        # Take the amount now, even if that leaves the bucket in debt; the caller waits the debt off
+        self.refill(now)
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def limit_to(self, remaining, now):
+        self.refill(now)
+        self.level = min(self.level, float(remaining))
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, max_retries=5, base_delay=1.0, max_delay=60.0, completion_tokens=500):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.completion_tokens = completion_tokens
+        self.lock = threading.Lock()
+        self.paused_until = 0.0
+        self.throttled = 0
+        self.retried = 0
+
+    def estimate_tokens(self, request):
+        if 'input' in request:
+            # An embeddings request: only its input counts
+            inputs = request['input']
+            return sum(count_text_tokens(text) for text in ([inputs] if isinstance(inputs, str) else inputs))
+
+        # Like the service, count the request's max_tokens against the TPM quota up front, whatever it ends up using
+        prompt_tokens = sum(count_message_tokens(message) for message in request.get('messages', []))
+        return prompt_tokens + (request.get('max_tokens') or request.get('max_completion_tokens') or self.completion_tokens)
+
+    def reserve(self, estimated_tokens):
+        with self.lock:
+            now = time.monotonic()
+            wait = max(0.0, self.paused_until - now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.reserve(estimated_tokens, now))
+            return wait
+
+    def update_from_headers(self, headers):
+        if headers is None:
+            return
+        with self.lock:
+            now = time.monotonic()
+            remaining_requests = headers.get('x-ratelimit-remaining-requests')
+            if remaining_requests is not None and self.requests is not None:
+                self.requests.limit_to(remaining_requests, now)
+            remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+            if remaining_tokens is not None and self.tokens is not None:
+                self.tokens.limit_to(remaining_tokens, now)
+
+    def get_retry_delay(self, error, attempt):
+        if isinstance(error, (APITimeoutError, APIConnectionError)):
+            retry_after = None
+        elif isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES:
+            retry_after = get_retry_after(error.response.headers)
+        else:
+            return None
+
+        if attempt >= self.max_retries:
+            return None
+        if retry_after is not None:
+            # Honor the server's hint, plus a little jitter so waiting clients don't all come back at once
+            return retry_after + random.uniform(0, min(1.0, retry_after * 0.1))
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def on_retry(self, error, delay):
+        with self.lock:
+            self.retried += 1
+            if getattr(error, 'status_code', None) == 429:
+                self.throttled += 1
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    def call(self, completions, parse=None, **request):
+        estimated_tokens = self.estimate_tokens(request)
+        attempt = 0
+        while True:
+            time.sleep(self.reserve(estimated_tokens))
+            try:
+                raw_response = completions.with_raw_response.create(**request)
+            except Exception as e:
+                delay = self.get_retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                self.on_retry(e, delay)
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            self.update_from_headers(raw_response.headers)
+            return parse(raw_response) if parse is not None else raw_response.parse()
+
+    async def call_async(self, completions, parse=None, **request):
+        estimated_tokens = self.estimate_tokens(request)
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.reserve(estimated_tokens))
+            try:
+                raw_response = await completions.with_raw_response.create(**request)
+            except Exception as e:
+                delay = self.get_retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                self.on_retry(e, delay)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            self.update_from_headers(raw_response.headers)
+            return parse(raw_response) if parse is not None else raw_response.parse()
+
+def get_retry_after(headers):
+    try:
+        retry_after_ms = headers.get('retry-after-ms')
+        if retry_after_ms is not None:
+            return float(retry_after_ms) / 1000
+        retry_after = headers.get('retry-after')
+        if retry_after is not None:
+            return float(retry_after)
+    except ValueError:
+        pass # an HTTP date; fall back to exponential backoff
+    return None
+
+# One limiter per deployment, shared by every chat instance in the process, since the quota is per deployment
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(deployment_name, requests_per_minute=None, tokens_per_minute=None, **kwargs):
+    # Called with no settings, it returns the deployment's limiter whatever its settings. Called with settings that
+    # differ from those it was created with, it raises rather than silently handing back the old limits.
+    settings = dict(kwargs, requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
+    settings = {name: value for name, value in settings.items() if value is not None}
+    with _limiters_lock:
+        limiter = _limiters.get(deployment_name)
+        if limiter is None:
+            limiter = _limiters[deployment_name] = RateLimiter(requests_per_minute, tokens_per_minute, **kwargs)
+            limiter.settings = settings
+        elif settings and settings != limiter.settings:
+            raise ValueError('The rate limiter for %r already exists with different settings: %r, not %r' % (deployment_name, limiter.settings, settings))
+        return limiter
@@ -0,0 +1,111 @@
+import json
+from openai import APIError
+
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+# Lightweight stand-ins for the SDK's ChatCompletionChunk and friends: just the fields the templates
+# read, in slotted objects, so relaying a stream doesn't pay for building and validating pydantic models
+
+class RawFunctionCall:
+    __slots__ = ('name', 'arguments')
+
+    def __init__(self, data):
+        self.name = data.get('name')
+        self.arguments = data.get('arguments')
+
+class RawToolCall:
+    __slots__ = ('index', 'id', 'type', 'function')
+
+    def __init__(self, data):
+        self.index = data.get('index')
+        self.id = data.get('id')
+        self.type = data.get('type')
+        function = data.get('function')
+        self.function = RawFunctionCall(function) if function is not None else None
+
+class RawDelta:
+    __slots__ = ('role', 'content', 'function_call', 'tool_calls', 'context')
+
+    def __init__(self, data):
+        self.role = data.get('role')
+        self.content = data.get('content')
+        function_call = data.get('function_call')
+        self.function_call = RawFunctionCall(function_call) if function_call is not None else None
+        tool_calls = data.get('tool_calls')
+        self.tool_calls = [RawToolCall(tool_call) for tool_call in tool_calls] if tool_calls is not None else None
+        self.context = data.get('context')
+
+class RawChoice:
+    __slots__ = ('index', 'delta', 'finish_reason')
+
+    def __init__(self, data):
+        self.index = data.get('index')
+        delta = data.get('delta')
+        self.delta = RawDelta(delta) if delta is not None else None
+        self.finish_reason = data.get('finish_reason')
+
+class RawUsage:
+    __slots__ = ('prompt_tokens', 'completion_tokens', 'total_tokens')
+
+    def __init__(self, data):
+        self.prompt_tokens = data.get('prompt_tokens')
+        self.completion_tokens = data.get('completion_tokens')
+        self.total_tokens = data.get('total_tokens')
+
+class RawChunk:
+    __slots__ = ('id', 'model', 'choices', 'usage')
+
+    def __init__(self, data):
+        self.id = data.get('id')
+        self.model = data.get('model')
+        self.choices = [RawChoice(choice) for choice in data.get('choices') or ()]
+        usage = data.get('usage')
+        self.usage = RawUsage(usage) if usage is not None else None
+
+def parse_sse_line(line):
+    # The service sends one `data:` line per event, so there is no multi-line event reassembly to do
+    if not line.startswith('data:'):
+        return None
+    payload = line[5:].strip()
+    if payload == '[DONE]':
+        return payload
+    return loads(payload)
+
+def iter_raw_chunks(raw_response):
+    http_response = raw_response.http_response
+    try:
+        for line in http_response.iter_lines():
+            data = parse_sse_line(line)
+            if data is None:
+                continue
+            if data == '[DONE]':
+                break
+            if 'error' in data:
+                raise APIError(json.dumps(data['error']), http_response.request, body=data['error'])
+            yield RawChunk(data)
+    finally:
+        http_response.close()
+
+async def iter_raw_chunks_async(raw_response):
+    http_response = raw_response.http_response
+    try:
+        async for line in http_response.aiter_lines():
+            data = parse_sse_line(line)
+            if data is None:
+                continue
+            if data == '[DONE]':
+                break
+            if 'error' in data:
+                raise APIError(json.dumps(data['error']), http_response.request, body=data['error'])
+            yield RawChunk(data)
+    finally:
+        await http_response.aclose()
+
+def create_raw_stream(completions, **request):
+    return iter_raw_chunks(completions.with_raw_response.create(**request))
+
+async def create_raw_stream_async(completions, **request):
+    return iter_raw_chunks_async(await completions.with_raw_response.create(**request))
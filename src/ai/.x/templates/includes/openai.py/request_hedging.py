@@ -0,0 +1,123 @@
+import threading
+from endpoint_pool import Endpoint
+
+def has_output(chunk):
+    choices = getattr(chunk, 'choices', None)
+    delta = getattr(choices[0], 'delta', None) if choices else None
+    return delta is not None and bool(getattr(delta, 'content', None) or getattr(delta, 'function_call', None) or getattr(delta, 'tool_calls', None))
+
+class HedgeRace:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.racers = 0
+        self.winner = None
+        self.errors = {}
+        self.responses = {}
+        self.decided = threading.Event()
+
+    def start(self, name, create, request):
+        with self.condition:
+            self.racers += 1
+        threading.Thread(target=self.run, args=(name, create, request), daemon=True).start()
+
+    def run(self, name, create, request):
+        try:
+            response = create(**request)
+            with self.condition:
+                lost = self.decided.is_set()
+                if not lost:
+                    self.responses[name] = response
+            if lost:
+                response.close() # the other request got there while this one was connecting
+                return
+
+            # One iterator for the whole stream: the winner's caller carries on from where this left off, and
+            # leaving a for loop over the response itself would close it (and the stream with it)
+            iterator = iter(response)
+            chunks = []
+            for chunk in iterator:
+                if self.decided.is_set():
+                    break
+                chunks.append(chunk)
+                if has_output(chunk):
+                    break
+        except Exception as e:
+            with self.condition:
+                self.errors[name] = e
+                self.condition.notify_all()
+            return
+
+        with self.condition:
+            won = not self.decided.is_set()
+            if won:
+                self.winner = (name, response, iterator, chunks)
+                self.decided.set()
+                losers = [other for other_name, other in self.responses.items() if other_name != name]
+                self.condition.notify_all()
+        if not won:
+            response.close()
+            return
+
+        # Cancel the other request now, rather than when it gets its first token: closing its
+        # response ends its read, and its thread sees the race is decided
+        for other in losers:
+            try:
+                other.close()
+            except Exception:
+                pass
+
+    def wait(self, timeout=None):
+        with self.condition:
+            self.condition.wait_for(lambda: self.winner is not None or len(self.errors) == self.racers, timeout)
+            return self.winner
+
+class RequestHedger:
+    def __init__(self, hedge_endpoint, openai_api_version, hedge_delay=0.5, http_client=None):
+        self.hedge_endpoint = hedge_endpoint if isinstance(hedge_endpoint, Endpoint) else Endpoint(*hedge_endpoint)
+        self.hedge_endpoint.create_client(openai_api_version, http_client)
+        self.hedge_delay = hedge_delay
+        self.lock = threading.Lock()
+        self.turns = 0
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def create_chat_completion(self, create, **request):
+        race = HedgeRace()
+        race.start('primary', create, request)
+
+        # Only hedge when the primary is slow to produce its first token (or has already failed)
+        fired = race.wait(self.hedge_delay) is None
+        if fired:
+            race.start('hedge', self.hedge_endpoint.create_chat_completion, request)
+
+        winner = race.wait()
+        with self.lock:
+            self.turns += 1
+            self.requests += 1 + fired
+            self.hedges_fired += fired
+            self.hedges_won += winner is not None and winner[0] == 'hedge'
+        if winner is None:
+            raise race.errors.get('primary') or race.errors['hedge']
+
+        name, response, iterator, chunks = winner
+        return self.stream(chunks, iterator, response)
+
+    def stream(self, chunks, iterator, response):
+        # Closed however the caller stops, so the winning HTTP stream is never left open
+        try:
+            yield from chunks
+            yield from iterator
+        finally:
+            response.close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'turns': self.turns,
+                'requests': self.requests,
+                'hedges_fired': self.hedges_fired,
+                'hedges_won': self.hedges_won,
+                'hedge_rate': self.hedges_fired / self.turns if self.turns else 0.0,
+                'hedge_win_rate': self.hedges_won / self.hedges_fired if self.hedges_fired else 0.0,
+            }
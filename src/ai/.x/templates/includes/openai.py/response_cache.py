@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+def normalize_message(message):
+    normalized = {}
+    for key in ['role', 'content', 'name', 'function_call', 'tool_calls', 'tool_call_id']:
+        value = message.get(key) if isinstance(message, dict) else getattr(message, key, None)
+        if value is None:
+            continue
+        normalized[key] = value.strip() if isinstance(value, str) else value
+    return normalized
+
+class ResponseCache:
+    def __init__(self, directory=None, max_memory_entries=256, ttl_seconds=24 * 60 * 60, max_disk_bytes=100 * 1024 * 1024, cache_nondeterministic=False):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_nondeterministic = cache_nondeterministic
+        self.memory = OrderedDict()
+        self.disk_bytes = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def is_cacheable(self, params):
+        if self.cache_nondeterministic:
+            return True
+        params = params or {}
+        return params.get('temperature') == 0 or params.get('top_p') == 0
+
+    def make_key(self, deployment, messages, tools=None, params=None):
+        request = {
+            'deployment': deployment,
+            'messages': [normalize_message(message) for message in messages],
+            'tools': tools,
+            'params': params or {},
+        }
+        text = json.dumps(request, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and entry[1] > now:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self.memory[key]
+
+        content, expires = self.read_from_disk(key, now)
+        with self.lock:
+            if content is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.remember(key, content, expires)
+            return content
+
+    def put(self, key, content, ttl_seconds=None):
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl_seconds <= 0:
+            return # expired as soon as stored, so not stored at all
+        expires = time.time() + ttl_seconds
+        with self.lock:
+            self.remember(key, content, expires)
+        self.write_to_disk(key, content, expires)
+
+    def delete(self, key):
+        with self.lock:
+            self.memory.pop(key, None)
+        if self.directory is not None:
+            try:
+                os.remove(self.file_name(key))
+            except OSError:
+                pass
+
+    def remember(self, key, content, expires):
+        self.memory[key] = (content, expires)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def file_name(self, cache_key):
+        return os.path.join(self.directory, cache_key[:2], cache_key + '.json')
+
+    def read_from_disk(self, key, now):
+        if self.directory is None:
+            return None, None
+
+        file_name = self.file_name(key)
+        try:
+            with open(file_name, 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+            expires = entry.get('expires', entry['created'] + self.ttl_seconds)
+            if expires <= now:
+                os.remove(file_name)
+                return None, None
+            return entry['content'], expires
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+    def write_to_disk(self, key, content, expires):
+        if self.directory is None:
+            return
+
+        file_name = self.file_name(key)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+
+        data = json.dumps({'created': time.time(), 'expires': expires, 'content': content}).encode('utf-8')
+        temp_file_name = f'{file_name}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_file_name, 'wb') as file:
+            file.write(data)
+        # The file's modification time is set to the entry's own expiry, so eviction can tell what has
+        # expired (whatever ttl it was stored with) from a directory listing, without opening every entry
+        os.utime(temp_file_name, (expires, expires))
+        os.replace(temp_file_name, file_name)
+
+        with self.lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = sum(size for _, size, _ in self.disk_entries())
+            else:
+                self.disk_bytes += len(data)
+            if self.disk_bytes > self.max_disk_bytes:
+                self.evict_from_disk()
+
+    def disk_entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime # the entry's expiry, see write_to_disk
+
+    def evict_from_disk(self):
+        # Expired entries go first, then those closest to expiring, until we are back under 90% of the limit
+        now = time.time()
+        entries = sorted(self.disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, expires in entries:
+            if total <= self.max_disk_bytes * 0.9 and expires > now:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self.disk_bytes = total
+
+    def replay(self, content, callback):
+        for piece in self.split_for_replay(content):
+            callback(piece)
+
+    def split_for_replay(self, content):
+        return re.findall(r'\s*\S+|\s+', content)
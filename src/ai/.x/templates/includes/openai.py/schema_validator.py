@@ -0,0 +1,219 @@
+import json
+import re
+
+# Compiles a function's JSON-schema parameters once into nested closures, so checking a call's arguments is
+# a handful of isinstance checks rather than a walk over the schema. Covers the JSON-schema subset used for
+# function parameters; unknown keywords are ignored. Obvious mismatches are coerced: "42" for an integer,
+# "2.5" for a number, "true" for a boolean, 3 for a string.
+
+INVALID = object()
+INTEGER = re.compile(r'\s*-?\d+\s*')
+NUMBER = re.compile(r'\s*-?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*')
+
+def is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+TYPE_CHECKS = {
+    'string': lambda value: isinstance(value, str),
+    'integer': is_integer,
+    'number': is_number,
+    'boolean': lambda value: isinstance(value, bool),
+    'array': lambda value: isinstance(value, list),
+    'object': lambda value: isinstance(value, dict),
+    'null': lambda value: value is None,
+}
+
+def coerce_integer(value):
+    if isinstance(value, str) and INTEGER.fullmatch(value):
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return INVALID
+
+def coerce_number(value):
+    if isinstance(value, str) and NUMBER.fullmatch(value):
+        return int(value) if INTEGER.fullmatch(value) else float(value)
+    return INVALID
+
+def coerce_boolean(value):
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+        return value.strip().lower() == 'true'
+    return INVALID
+
+def coerce_string(value):
+    return str(value) if is_number(value) else INVALID
+
+COERCIONS = {'integer': coerce_integer, 'number': coerce_number, 'boolean': coerce_boolean, 'string': coerce_string}
+
+def compile_type_check(types):
+    checks = [TYPE_CHECKS[name] for name in types if name in TYPE_CHECKS]
+    coercions = [COERCIONS[name] for name in types if name in COERCIONS]
+    expected = ' or '.join(types)
+
+    def check(value, path, errors):
+        for type_check in checks:
+            if type_check(value):
+                return value
+        for coerce in coercions:
+            coerced = coerce(value)
+            if coerced is not INVALID:
+                return coerced
+        errors.append({'path': path, 'message': 'expected %s, got %s' % (expected, json.dumps(value, default=str)[:80])})
+        return INVALID
+    return check
+
+def compile_enum_check(values):
+    allowed = set(json.dumps(value, sort_keys=True) for value in values)
+
+    def check(value, path, errors):
+        if json.dumps(value, sort_keys=True) in allowed:
+            return value
+        errors.append({'path': path, 'message': 'must be one of %s' % json.dumps(values)})
+        return INVALID
+    return check
+
+def compile_range_check(schema):
+    limits = [(key, schema[key]) for key in ('minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum') if key in schema]
+    tests = {
+        'minimum': lambda value, limit: value >= limit,
+        'maximum': lambda value, limit: value <= limit,
+        'exclusiveMinimum': lambda value, limit: value > limit,
+        'exclusiveMaximum': lambda value, limit: value < limit,
+    }
+
+    def check(value, path, errors):
+        if is_number(value):
+            for key, limit in limits:
+                if not tests[key](value, limit):
+                    errors.append({'path': path, 'message': 'must satisfy %s %s' % (key, limit)})
+                    return INVALID
+        return value
+    return check
+
+def compile_length_check(schema, minimum_key, maximum_key, kind, unit):
+    minimum, maximum = schema.get(minimum_key), schema.get(maximum_key)
+
+    def check(value, path, errors):
+        if isinstance(value, kind):
+            if minimum is not None and len(value) < minimum:
+                errors.append({'path': path, 'message': 'must have at least %d %s' % (minimum, unit)})
+                return INVALID
+            if maximum is not None and len(value) > maximum:
+                errors.append({'path': path, 'message': 'must have at most %d %s' % (maximum, unit)})
+                return INVALID
+        return value
+    return check
+
+def compile_pattern_check(pattern):
+    regex = re.compile(pattern)
+
+    def check(value, path, errors):
+        if isinstance(value, str) and regex.search(value) is None:
+            errors.append({'path': path, 'message': 'must match %s' % pattern})
+            return INVALID
+        return value
+    return check
+
+def compile_object_check(schema):
+    properties = {name: compile_schema(property_schema) for name, property_schema in (schema.get('properties') or {}).items()}
+    required = list(schema.get('required') or [])
+    additional = schema.get('additionalProperties', True)
+    additional_check = compile_schema(additional) if isinstance(additional, dict) else None
+
+    def check(value, path, errors):
+        if not isinstance(value, dict):
+            return value
+        result = {}
+        valid = True
+        for name in required:
+            if name not in value:
+                errors.append({'path': '%s.%s' % (path, name), 'message': 'is required'})
+                valid = False
+        for name, item in value.items():
+            item_check = properties.get(name, additional_check)
+            if item_check is not None:
+                item = item_check(item, '%s.%s' % (path, name), errors)
+            elif additional is False:
+                errors.append({'path': '%s.%s' % (path, name), 'message': 'is not an allowed property'})
+                item = INVALID
+            valid = valid and item is not INVALID
+            result[name] = item
+        return result if valid else INVALID
+    return check
+
+def compile_array_check(items_schema):
+    item_check = compile_schema(items_schema)
+
+    def check(value, path, errors):
+        if not isinstance(value, list):
+            return value
+        result = [item_check(item, '%s[%d]' % (path, index), errors) for index, item in enumerate(value)]
+        return INVALID if any(item is INVALID for item in result) else result
+    return check
+
+def compile_any_of_check(schemas):
+    options = [compile_schema(option) for option in schemas]
+
+    def check(value, path, errors):
+        option_errors = []
+        for option in options:
+            attempt = []
+            result = option(value, path, attempt)
+            if result is not INVALID:
+                return result
+            option_errors.extend(attempt)
+        errors.append({'path': path, 'message': 'matches none of the allowed schemas: ' + '; '.join(error['message'] for error in option_errors)})
+        return INVALID
+    return check
+
+def compile_schema(schema):
+    checks = []
+    types = schema.get('type')
+    if types is not None:
+        checks.append(compile_type_check([types] if isinstance(types, str) else list(types)))
+    if 'enum' in schema:
+        checks.append(compile_enum_check(schema['enum']))
+    if 'const' in schema:
+        checks.append(compile_enum_check([schema['const']]))
+    if any(key in schema for key in ('minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum')):
+        checks.append(compile_range_check(schema))
+    if 'minLength' in schema or 'maxLength' in schema:
+        checks.append(compile_length_check(schema, 'minLength', 'maxLength', str, 'characters'))
+    if 'minItems' in schema or 'maxItems' in schema:
+        checks.append(compile_length_check(schema, 'minItems', 'maxItems', list, 'items'))
+    if 'pattern' in schema:
+        checks.append(compile_pattern_check(schema['pattern']))
+    if 'properties' in schema or 'required' in schema or 'additionalProperties' in schema:
+        checks.append(compile_object_check(schema))
+    if 'items' in schema and isinstance(schema['items'], dict):
+        checks.append(compile_array_check(schema['items']))
+    if 'anyOf' in schema or 'oneOf' in schema:
+        checks.append(compile_any_of_check(schema.get('anyOf') or schema.get('oneOf')))
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def validate(value, path, errors):
+        for check in checks:
+            value = check(value, path, errors)
+            if value is INVALID:
+                break
+        return value
+    return validate
+
+def compile_validator(parameters_schema):
+    # Returns validate(arguments) -> (arguments with coercions applied, None) or (None, list of errors)
+    check = compile_schema(parameters_schema or {'type': 'object'})
+
+    def validate(arguments):
+        errors = []
+        result = check(arguments, '$', errors)
+        return (None, errors) if result is INVALID or errors else (result, None)
+    return validate
+
+def format_validation_error(function_name, errors):
+    # What the model sees instead of a result, so it can fix the call on its next try
+    return json.dumps({'error': 'invalid_arguments', 'function': function_name, 'details': errors})
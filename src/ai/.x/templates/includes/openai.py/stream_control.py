@@ -0,0 +1,163 @@
+import asyncio
+import queue
+import re
+import threading
+from chat_history import count_text_tokens
+
+# A callback can return this to end the answer where it is
+STOP = 'stop'
+
+class CancelToken:
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+class StopConditions:
+    def __init__(self, max_chars=None, max_tokens=None, stop_patterns=None, pattern_lookback=256):
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
+        self.stop_patterns = [re.compile(p) if isinstance(p, str) else p for p in stop_patterns or []]
+        self.pattern_lookback = pattern_lookback
+
+    def start(self, cancel_token=None):
+        return StopState(self, cancel_token)
+
+class StopState:
+    def __init__(self, conditions, cancel_token=None):
+        self.conditions = conditions
+        self.cancel_token = cancel_token
+        self.chars = 0
+        self.tokens = 0
+        self.recent = ''
+        self.reason = None
+
+    def check(self, content):
+        # Returns the part of content to keep; sets reason once the answer should end
+        if self.cancel_token is not None and self.cancel_token.cancelled:
+            self.reason = 'cancelled'
+            return ''
+
+        conditions = self.conditions
+        if conditions.stop_patterns:
+            # Search the tail of what came before too, so a pattern split across chunks still matches
+            text = self.recent + content
+            for pattern in conditions.stop_patterns:
+                match = pattern.search(text)
+                if match is not None:
+                    content = content[:max(0, match.start() - len(self.recent))]
+                    self.reason = 'stop_pattern'
+                    break
+            self.recent = text[-conditions.pattern_lookback:]
+
+        if conditions.max_chars is not None and self.chars + len(content) >= conditions.max_chars:
+            content = content[:conditions.max_chars - self.chars]
+            self.reason = self.reason or 'max_chars'
+        self.chars += len(content)
+
+        if conditions.max_tokens is not None:
+            self.tokens += count_text_tokens(content)
+            if self.tokens >= conditions.max_tokens:
+                self.reason = self.reason or 'max_tokens'
+
+        return content
+
+    def on_callback_result(self, result):
+        if result == STOP:
+            self.reason = self.reason or 'callback'
+
+NO_STOP_CONDITIONS = StopConditions()
+
+def close_stream(response):
+    # Closing the SDK stream (or our generator around it) drops the HTTP response, which stops generation server-side
+    close = getattr(response, 'close', None)
+    if close is not None:
+        close()
+
+async def close_stream_async(response):
+    close = getattr(response, 'aclose', None) or getattr(response, 'close', None)
+    if close is not None:
+        await close()
+
+
+class ReadAhead:
+    # Reads a response stream on its own thread into a bounded queue, so the HTTP stream keeps being drained
+    # at network speed while the caller's loop (callbacks, sinks) works through what has already arrived
+    DONE = object()
+
+    def __init__(self, response, max_pending=1024):
+        self.response = response
+        self.queue = queue.Queue(max(1, max_pending))
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.read, name='stream-reader', daemon=True)
+        self.thread.start()
+
+    def read(self):
+        try:
+            for chunk in self.response:
+                if not self.put((chunk, None)):
+                    return
+            self.put((self.DONE, None))
+        except Exception as e:
+            self.put((self.DONE, e))
+
+    def put(self, item):
+        # A full queue holds the reader back (backpressure), but never past close()
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        while True:
+            chunk, error = self.queue.get()
+            if chunk is self.DONE:
+                if error is not None and not self.stopped.is_set():
+                    raise error
+                return
+            yield chunk
+
+    def close(self):
+        self.stopped.set()
+        close_stream(self.response)
+
+class ReadAheadAsync:
+    # The same, for async streams: a reader task feeds a bounded asyncio queue
+    DONE = object()
+
+    def __init__(self, response, max_pending=1024):
+        self.response = response
+        self.queue = asyncio.Queue(max(1, max_pending))
+        self.task = asyncio.get_running_loop().create_task(self.read())
+
+    async def read(self):
+        try:
+            async for chunk in self.response:
+                await self.queue.put((chunk, None))
+            await self.queue.put((self.DONE, None))
+        except Exception as e:
+            await self.queue.put((self.DONE, e))
+
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        while True:
+            chunk, error = await self.queue.get()
+            if chunk is self.DONE:
+                if error is not None:
+                    raise error
+                return
+            yield chunk
+
+    async def aclose(self):
+        self.task.cancel()
+        await close_stream_async(self.response)
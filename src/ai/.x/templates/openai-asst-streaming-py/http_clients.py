@@ -0,0 +1 @@
+{{@include openai.py/http_clients.py}}
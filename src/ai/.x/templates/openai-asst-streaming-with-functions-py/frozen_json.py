@@ -0,0 +1 @@
+{{@include openai.py/frozen_json.py}}
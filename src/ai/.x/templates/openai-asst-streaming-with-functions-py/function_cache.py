@@ -0,0 +1 @@
+{{@include openai.py/function_cache.py}}
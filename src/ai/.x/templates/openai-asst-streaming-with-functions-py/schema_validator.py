@@ -0,0 +1 @@
+{{@include openai.py/schema_validator.py}}
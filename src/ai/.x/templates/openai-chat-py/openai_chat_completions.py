@@ -1,4 +1,6 @@
 from openai import AzureOpenAI
+from chat_history import ChatHistory
+from http_clients import get_http_client
 import os
 import sys
 
@@ -7,19 +9,22 @@ openai_api_version = os.getenv('AZURE_OPENAI_API_VERSION', '{AZURE_OPENAI_API_VE
 openai_endpoint = os.getenv('AZURE_OPENAI_ENDPOINT', '{AZURE_OPENAI_ENDPOINT}')
 openai_chat_deployment_name = os.getenv('AZURE_OPENAI_CHAT_DEPLOYMENT', '{AZURE_OPENAI_CHAT_DEPLOYMENT}')
 openai_system_prompt = os.getenv('AZURE_OPENAI_SYSTEM_PROMPT', '{AZURE_OPENAI_SYSTEM_PROMPT}')
+openai_max_history_tokens = os.getenv('AZURE_OPENAI_MAX_HISTORY_TOKENS')
 
 client = AzureOpenAI(
   api_key=openai_api_key,
   api_version=openai_api_version,
-  azure_endpoint = openai_endpoint
+  azure_endpoint = openai_endpoint,
+  http_client = get_http_client()
 )
 
-messages=[
-    {'role': 'system', 'content': openai_system_prompt},
-]
+messages = ChatHistory(
+    [{'role': 'system', 'content': openai_system_prompt}],
+    max_tokens=int(openai_max_history_tokens) if openai_max_history_tokens else None)
 
 def get_chat_completions(user_input) -> str:
     messages.append({'role': 'user', 'content': user_input})
+    messages.trim()
 
     response = client.chat.completions.create(
         model=openai_chat_deployment_name,
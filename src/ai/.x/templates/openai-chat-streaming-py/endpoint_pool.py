@@ -0,0 +1 @@
+{{@include openai.py/endpoint_pool.py}}
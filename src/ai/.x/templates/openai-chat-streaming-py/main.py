@@ -1,4 +1,6 @@
 from openai_chat_completions_streaming import {ClassName}
+from batch_runner import run_batch
+from output_sinks import CoalescingOutput, StdoutSink
 import os
 import sys
 
@@ -9,7 +11,13 @@ def main():
     openai_chat_deployment_name = os.getenv('AZURE_OPENAI_CHAT_DEPLOYMENT', '{AZURE_OPENAI_CHAT_DEPLOYMENT}')
     openai_system_prompt = os.getenv('AZURE_OPENAI_SYSTEM_PROMPT', '{AZURE_OPENAI_SYSTEM_PROMPT}')
 
+    if len(sys.argv) > 3 and sys.argv[1] == '--batch':
+        concurrency = int(sys.argv[4]) if len(sys.argv) > 4 else 8
+        run_batch(lambda: {ClassName}(openai_api_version, openai_endpoint, openai_api_key, openai_chat_deployment_name, openai_system_prompt), sys.argv[2], sys.argv[3], concurrency)
+        return
+
     chat = {ClassName}(openai_api_version, openai_endpoint, openai_api_key, openai_chat_deployment_name, openai_system_prompt)
+    output = CoalescingOutput(StdoutSink())
 
     while True:
         user_input = input('User: ')
@@ -17,7 +25,8 @@ def main():
             break
 
         print("\nAssistant: ", end="")
-        response = chat.get_chat_completions(user_input, lambda content: print(content, end=""))
+        response = chat.get_chat_completions(user_input, output)
+        output.flush()
         print("\n")
 
 if __name__ == '__main__':
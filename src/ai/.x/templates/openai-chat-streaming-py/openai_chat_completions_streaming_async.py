@@ -0,0 +1,142 @@
+import contextlib
+import inspect
+from openai import AsyncAzureOpenAI
+from chat_history import ChatHistory
+from chat_history_file import ChatHistoryFile
+from http_clients import get_async_http_client
+from stream_control import NO_STOP_CONDITIONS, STOP, CancelToken, ReadAheadAsync, close_stream_async
+from raw_sse import create_raw_stream_async, iter_raw_chunks_async
+
+class {ClassName}Async:
+    def __init__(self, openai_api_version, openai_endpoint, openai_key, openai_chat_deployment_name, openai_system_prompt, max_history_tokens=None, history_summarizer=None, completion_options=None, response_cache=None, metrics=None, http_client=None, rate_limiter=None, history_file=None, raw_stream=False, stop_conditions=None, read_ahead=None):
+        self.openai_system_prompt = openai_system_prompt
+        self.max_history_tokens = max_history_tokens
+        self.history_summarizer = history_summarizer
+        self.history_file = ChatHistoryFile(history_file) if isinstance(history_file, str) else history_file
+        self.completion_options = completion_options or {}
+        self.stop_conditions = stop_conditions or NO_STOP_CONDITIONS
+        self.read_ahead = read_ahead
+        self.response_cache = response_cache
+        self.metrics = metrics
+        self.rate_limiter = rate_limiter
+        self.raw_stream = raw_stream
+        self.openai_chat_deployment_name = openai_chat_deployment_name
+        self.open_stream = None
+        self.client = AsyncAzureOpenAI(
+            api_key=openai_key,
+            api_version=openai_api_version,
+            azure_endpoint = openai_endpoint,
+            http_client = http_client or get_async_http_client()
+            )
+        self.clear_conversation()
+
+    def clear_conversation(self):
+        self.messages = ChatHistory(
+            [{'role': 'system', 'content': self.openai_system_prompt}],
+            max_tokens=self.max_history_tokens,
+            summarizer=self.history_summarizer,
+            history_file=self.history_file)
+
+    async def create_chat_completion(self, **request):
+        if self.rate_limiter is None:
+            return await create_raw_stream_async(self.client.chat.completions, **request) if self.raw_stream else await self.client.chat.completions.create(**request)
+        # The limiter does its own throttling and retries, so the SDK's are turned off
+        return await self.rate_limiter.call_async(self.client.with_options(max_retries=0).chat.completions, parse=iter_raw_chunks_async if self.raw_stream else None, **request)
+
+    async def get_chat_completions(self, user_input, callback, cancel_token=None):
+        cancel_token = cancel_token or CancelToken()
+        async with contextlib.aclosing(self.get_chat_completions_stream(user_input, cancel_token)) as stream:
+            async for content in stream:
+                result = callback(content)
+                if inspect.isawaitable(result):
+                    result = await result
+                if result == STOP:
+                    cancel_token.cancel()
+
+        return self.messages[-1]['content']
+
+    async def get_chat_completions_stream(self, user_input, cancel_token=None):
+        # A caller that stops reading early leaves this generator to be closed whenever it is collected. The turn
+        # itself is closed before the next one starts instead, so its reply is recorded ahead of the next question.
+        if self.open_stream is not None:
+            await self.open_stream.aclose()
+        async with contextlib.aclosing(self.stream_turn(user_input, cancel_token)) as stream:
+            self.open_stream = stream
+            async for content in stream:
+                yield content
+
+    async def stream_turn(self, user_input, cancel_token):
+        messages = self.messages
+        messages.append({'role': 'user', 'content': user_input})
+        await messages.trim_async()
+
+        cache_key = self.get_cache_key()
+        cached_content = self.response_cache.get(cache_key) if cache_key else None
+        if cached_content is not None:
+            replayed = []
+            try:
+                for content in self.response_cache.split_for_replay(cached_content):
+                    replayed.append(content)
+                    yield content
+            finally:
+                messages.append({'role': 'assistant', 'content': ''.join(replayed)})
+            return
+
+        turn = self.metrics.start_turn(self.openai_chat_deployment_name) if self.metrics else None
+        if turn: turn.on_request()
+
+        stop = self.stop_conditions.start(cancel_token)
+        content_chunks = []
+        completion_finish_reason = None
+        finished = False
+        response = await self.create_chat_completion(
+            model=self.openai_chat_deployment_name,
+            messages=messages,
+            stream=True,
+            **self.completion_options)
+        if self.read_ahead:
+            # Read the HTTP stream in its own task, so a slow consumer doesn't stall it
+            response = ReadAheadAsync(response, self.read_ahead)
+
+        # The caller can stop iterating at any point (break, cancellation); whatever was yielded by
+        # then is still recorded as the assistant's turn, so the history never ends on an unanswered user turn
+        try:
+            async for chunk in response:
+
+                if turn: turn.on_chunk(chunk)
+                choice0 = chunk.choices[0] if hasattr(chunk, 'choices') and chunk.choices else None
+                delta = choice0.delta if choice0 and hasattr(choice0, 'delta') else None
+                content = delta.content if delta and hasattr(delta, 'content') else ''
+
+                finish_reason = choice0.finish_reason if choice0 and hasattr(choice0, 'finish_reason') else None
+                completion_finish_reason = finish_reason or completion_finish_reason
+                if finish_reason == 'length':
+                    content += f"{content}\nERROR: Exceeded max token length!"
+
+                if content is None: continue
+
+                content = stop.check(content)
+                content_chunks.append(content)
+                yield content
+
+                if stop.reason:
+                    break
+            finished = not stop.reason
+        finally:
+            if not finished:
+                await close_stream_async(response)
+
+            complete_content = ''.join(content_chunks)
+            if turn and not finished:
+                turn.finish_reason = stop.reason or 'cancelled'
+            if cache_key and finished and completion_finish_reason == 'stop':
+                self.response_cache.put(cache_key, complete_content)
+            if turn:
+                self.metrics.end_turn(turn)
+
+            messages.append({'role': 'assistant', 'content': complete_content})
+
+    def get_cache_key(self):
+        if self.response_cache is None or not self.response_cache.is_cacheable(self.completion_options):
+            return None
+        return self.response_cache.make_key(self.openai_chat_deployment_name, self.messages, None, self.completion_options)
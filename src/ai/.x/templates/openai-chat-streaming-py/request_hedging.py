@@ -0,0 +1 @@
+{{@include openai.py/request_hedging.py}}
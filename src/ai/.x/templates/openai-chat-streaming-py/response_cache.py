@@ -0,0 +1 @@
+{{@include openai.py/response_cache.py}}
@@ -0,0 +1 @@
+{{@include openai.py/document_chunker.py}}
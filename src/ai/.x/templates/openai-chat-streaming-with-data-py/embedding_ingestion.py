@@ -0,0 +1 @@
+{{@include openai.py/embedding_ingestion.py}}
@@ -0,0 +1 @@
+{{@include openai.py/local_vector_index.py}}
@@ -1,4 +1,6 @@
 from openai_chat_completions_with_data_streaming import {ClassName}
+from batch_runner import run_batch
+from output_sinks import CoalescingOutput, StdoutSink
 import os
 import sys
 
@@ -13,8 +15,27 @@ def main():
     search_api_key = os.getenv('AZURE_AI_SEARCH_KEY', '{AZURE_AI_SEARCH_KEY}')
     search_endpoint =os.getenv('AZURE_AI_SEARCH_ENDPOINT', '{AZURE_AI_SEARCH_ENDPOINT}')
     search_index_name = os.getenv('AZURE_AI_SEARCH_INDEX_NAME', '{AZURE_AI_SEARCH_INDEX_NAME}')
+    local_index_dir = os.getenv('AZURE_OPENAI_LOCAL_INDEX_DIR')
 
-    chat = {ClassName}(openai_api_version, openai_endpoint, openai_api_key, openai_chat_deployment_name, openai_system_prompt, search_endpoint, search_api_key, search_index_name, openai_embeddings_endpoint)
+    # Imported only when used, since ingestion needs numpy and plain chat doesn't
+    if len(sys.argv) > 3 and sys.argv[1] == '--chunk':
+        from document_chunker import run_chunking
+        run_chunking(sys.argv[2], sys.argv[3])
+        return
+
+    if len(sys.argv) > 3 and sys.argv[1] == '--ingest':
+        from embedding_ingestion import run_ingestion
+        concurrency = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+        run_ingestion(openai_api_version, openai_endpoint, openai_api_key, openai_embeddings_deployment_name, sys.argv[2], sys.argv[3], concurrency)
+        return
+
+    if len(sys.argv) > 3 and sys.argv[1] == '--batch':
+        concurrency = int(sys.argv[4]) if len(sys.argv) > 4 else 8
+        run_batch(lambda: {ClassName}(openai_api_version, openai_endpoint, openai_api_key, openai_chat_deployment_name, openai_system_prompt, search_endpoint, search_api_key, search_index_name, openai_embeddings_endpoint, local_index=local_index_dir), sys.argv[2], sys.argv[3], concurrency)
+        return
+
+    chat = {ClassName}(openai_api_version, openai_endpoint, openai_api_key, openai_chat_deployment_name, openai_system_prompt, search_endpoint, search_api_key, search_index_name, openai_embeddings_endpoint, local_index=local_index_dir)
+    output = CoalescingOutput(StdoutSink())
 
     while True:
         user_input = input('User: ')
@@ -22,7 +43,8 @@ def main():
             break
 
         print("\nAssistant: ", end="")
-        response = chat.get_chat_completions(user_input, lambda content: print(content, end=""))
+        response = chat.get_chat_completions(user_input, output)
+        output.flush()
         print("\n")
 
 if __name__ == '__main__':
@@ -1,61 +1,164 @@
+import re
 from openai import AzureOpenAI
+from chat_history import ChatHistory
+from chat_history_file import ChatHistoryFile
+from http_clients import get_http_client
+from stream_control import NO_STOP_CONDITIONS, ReadAhead, close_stream
+from raw_sse import create_raw_stream, iter_raw_chunks
 
 class {ClassName}:
-    def __init__(self, openai_api_version, openai_endpoint, openai_key, openai_chat_deployment_name, openai_system_prompt, search_endpoint, search_api_key, search_index_name, openai_embeddings_endpoint):
+    def __init__(self, openai_api_version, openai_endpoint, openai_key, openai_chat_deployment_name, openai_system_prompt, search_endpoint, search_api_key, search_index_name, openai_embeddings_endpoint, max_history_tokens=None, history_summarizer=None, completion_options=None, response_cache=None, metrics=None, http_client=None, rate_limiter=None, history_file=None, raw_stream=False, stop_conditions=None, local_index=None, local_search_options=None, read_ahead=None):
         self.openai_system_prompt = openai_system_prompt
+        self.max_history_tokens = max_history_tokens
+        self.history_summarizer = history_summarizer
+        self.history_file = ChatHistoryFile(history_file) if isinstance(history_file, str) else history_file
+        self.completion_options = completion_options or {}
+        self.stop_conditions = stop_conditions or NO_STOP_CONDITIONS
+        self.read_ahead = read_ahead
+        self.response_cache = response_cache
+        self.metrics = metrics
+        self.rate_limiter = rate_limiter
+        self.raw_stream = raw_stream
         self.openai_chat_deployment_name = openai_chat_deployment_name
-        self.client = AzureOpenAI(
-            api_key=openai_key,
-            api_version=openai_api_version,
-            base_url = f"{openai_endpoint.rstrip('/')}/openai/deployments/{openai_chat_deployment_name}/extensions"
-            )
-        self.extra_body={
-            "dataSources": [
-                {
-                    "type": "AzureCognitiveSearch",
-                    "parameters": {
-                        "endpoint": search_endpoint,
-                        "key": search_api_key,
-                        "indexName": search_index_name,
-                        "embeddingEndpoint": openai_embeddings_endpoint,
-                        "embeddingKey": openai_key,
-                        "queryType": "vectorSimpleHybrid"
+        self.local_index = local_index
+        self.last_sources = []
+        self.local_search_options = {'top_k': 5, 'mode': 'hybrid', 'probes': None, **(local_search_options or {})}
+
+        if local_index is None:
+            self.client = AzureOpenAI(
+                api_key=openai_key,
+                api_version=openai_api_version,
+                base_url = f"{openai_endpoint.rstrip('/')}/openai/deployments/{openai_chat_deployment_name}/extensions",
+                http_client = http_client or get_http_client()
+                )
+            self.extra_body={
+                "dataSources": [
+                    {
+                        "type": "AzureCognitiveSearch",
+                        "parameters": {
+                            "endpoint": search_endpoint,
+                            "key": search_api_key,
+                            "indexName": search_index_name,
+                            "embeddingEndpoint": openai_embeddings_endpoint,
+                            "embeddingKey": openai_key,
+                            "queryType": "vectorSimpleHybrid"
+                        }
                     }
-                }
-            ]
-        }
+                ]
+            }
+        else:
+            # Retrieve from a local index and put the sources in the prompt ourselves, instead of the service-side extension
+            if isinstance(local_index, str):
+                from local_vector_index import LocalVectorIndex
+                self.local_index = LocalVectorIndex(local_index)
+            match = re.search(r'/deployments/([^/]+)/embeddings', openai_embeddings_endpoint or '')
+            self.openai_embeddings_deployment_name = match.group(1) if match else openai_embeddings_endpoint
+            self.client = AzureOpenAI(
+                api_key=openai_key,
+                api_version=openai_api_version,
+                azure_endpoint = openai_endpoint,
+                http_client = http_client or get_http_client()
+                )
+            self.extra_body = None
 
         self.clear_conversation()
 
     def clear_conversation(self):
-        self.messages = [
-            {'role': 'system', 'content': self.openai_system_prompt}
-        ]
+        self.messages = ChatHistory(
+            [{'role': 'system', 'content': self.openai_system_prompt}],
+            max_tokens=self.max_history_tokens,
+            summarizer=self.history_summarizer,
+            history_file=self.history_file)
+
+    def create_chat_completion(self, **request):
+        if self.rate_limiter is None:
+            return create_raw_stream(self.client.chat.completions, **request) if self.raw_stream else self.client.chat.completions.create(**request)
+        # The limiter does its own throttling and retries, so the SDK's are turned off
+        return self.rate_limiter.call(self.client.with_options(max_retries=0).chat.completions, parse=iter_raw_chunks if self.raw_stream else None, **request)
 
-    def get_chat_completions(self, user_input, callback):
+    def get_chat_completions(self, user_input, callback, cancel_token=None):
         self.messages.append({'role': 'user', 'content': user_input})
+        self.messages.trim()
+
+        messages = self.add_local_sources(self.messages, user_input) if self.local_index is not None else self.messages
+        cache_key = self.get_cache_key(messages)
+        cached_content = self.response_cache.get(cache_key) if cache_key else None
+        if cached_content is not None:
+            self.response_cache.replay(cached_content, callback)
+            self.messages.append({'role': 'assistant', 'content': cached_content})
+            return cached_content
 
-        complete_content = ''
-        response = self.client.chat.completions.create(
+        turn = self.metrics.start_turn(self.openai_chat_deployment_name) if self.metrics else None
+        if turn: turn.on_request()
+
+        stop = self.stop_conditions.start(cancel_token)
+        content_chunks = []
+        completion_finish_reason = None
+        response = self.create_chat_completion(
             model=self.openai_chat_deployment_name,
-            messages=self.messages,
+            messages=messages,
             extra_body=self.extra_body,
-            stream=True)
+            stream=True,
+            **self.completion_options)
+        if self.read_ahead:
+            # Read the HTTP stream on its own thread, so a slow callback doesn't stall it
+            response = ReadAhead(response, self.read_ahead)
+
+        try:
+            for chunk in response:
 
-        for chunk in response:
+                if turn: turn.on_chunk(chunk)
+                choice0 = chunk.choices[0] if hasattr(chunk, 'choices') and chunk.choices else None
+                delta = choice0.delta if choice0 and hasattr(choice0, 'delta') else None
+                content = delta.content if delta and hasattr(delta, 'content') else ''
 
-            choice0 = chunk.choices[0] if hasattr(chunk, 'choices') and chunk.choices else None
-            delta = choice0.delta if choice0 and hasattr(choice0, 'delta') else None
-            content = delta.content if delta and hasattr(delta, 'content') else ''
+                finish_reason = choice0.finish_reason if choice0 and hasattr(choice0, 'finish_reason') else None
+                completion_finish_reason = finish_reason or completion_finish_reason
+                if finish_reason == 'length':
+                    content += f"{content}\nERROR: Exceeded max token length!"
 
-            finish_reason = choice0.finish_reason if choice0 and hasattr(choice0, 'finish_reason') else None
-            if finish_reason == 'length':
-                content += f"{content}\nERROR: Exceeded max token length!"
+                if content is None: continue
 
-            if content is None: continue
+                content = stop.check(content)
+                content_chunks.append(content)
+                stop.on_callback_result(callback(content))
 
-            complete_content += content
-            callback(content)
+                if stop.reason:
+                    break
+        finally:
+            # However the loop ends (a stop condition, or an exception from a callback or sink), the stream
+            # is closed, and with it any reader thread
+            close_stream(response)
+
+        complete_content = ''.join(content_chunks)
+        if turn and stop.reason:
+            turn.finish_reason = stop.reason
+        if cache_key and completion_finish_reason == 'stop' and not stop.reason:
+            self.response_cache.put(cache_key, complete_content)
+        if turn:
+            self.metrics.end_turn(turn)
 
         self.messages.append({'role': 'assistant', 'content': complete_content})
         return complete_content
+
+    def add_local_sources(self, messages, user_input):
+        options = self.local_search_options
+        query_vector = None
+        if options['mode'] != 'text':
+            query_vector = self.client.embeddings.create(model=self.openai_embeddings_deployment_name, input=user_input).data[0].embedding
+        sources = self.local_index.search(user_input, query_vector, k=options['top_k'], mode=options['mode'], probes=options['probes'])
+
+        # [docN] in the answer is last_sources[N - 1], whose filepath, start and end give the cited byte span
+        self.last_sources = sources
+        if not sources:
+            return messages
+
+        # Sent with this request only; the history keeps just the user's question
+        documents = '\n\n'.join('[doc%d] %s\n%s' % (i + 1, source.get('title') or source.get('filepath') or '', source.get('content', '')) for i, source in enumerate(sources))
+        sources_message = {'role': 'system', 'content': 'Answer using the sources below, citing them as [docN] where used.\n\n' + documents}
+        return list(messages[:-1]) + [sources_message, messages[-1]]
+
+    def get_cache_key(self, messages):
+        if self.response_cache is None or not self.response_cache.is_cacheable(self.completion_options):
+            return None
+        return self.response_cache.make_key(self.openai_chat_deployment_name, messages, None, {**self.completion_options, 'extra_body': self.extra_body})
@@ -0,0 +1 @@
+{{@include openai.py/rate_limiter.py}}
@@ -0,0 +1 @@
+{{@include openai.py/batch_runner.py}}
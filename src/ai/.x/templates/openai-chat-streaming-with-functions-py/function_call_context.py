@@ -1,12 +1,20 @@
 import json
 import logging
+import time
+from incremental_json import IncrementalJsonParser
 
 class FunctionCallContext:
-    def __init__(self, function_factory, messages):
+    def __init__(self, function_factory, messages, early_dispatch=True):
         self.function_factory = function_factory
         self.messages = messages
+        self.early_dispatch = early_dispatch
         self.function_name = ''
-        self.function_arguments = ''
+        self.function_arguments_parser = IncrementalJsonParser()
+        self.tool_calls = []
+
+    @property
+    def function_arguments(self):
+        return self.function_arguments_parser.text
 
     def check_for_update(self, choice):
         updated = False
@@ -19,14 +27,29 @@ class FunctionCallContext:
 
         args = delta.function_call.arguments if delta and hasattr(delta, 'function_call') and delta.function_call and hasattr(delta.function_call, 'arguments') else None
         if args is not None:
-            self.function_arguments = f'{self.function_arguments}{args}'
+            self.function_arguments_parser.feed(args)
+            updated = True
+
+        tool_calls = delta.tool_calls if delta and hasattr(delta, 'tool_calls') else None
+        for tool_call in tool_calls or []:
+            while len(self.tool_calls) <= tool_call.index:
+                self.tool_calls.append({'id': '', 'name': '', 'arguments': IncrementalJsonParser(), 'future': None, 'start': None})
+            call = self.tool_calls[tool_call.index]
+            call['id'] = tool_call.id or call['id']
+            function = tool_call.function
+            if function is not None:
+                call['name'] = function.name or call['name']
+                if call['arguments'].feed(function.arguments) and self.early_dispatch and call['name'] and call['start'] is None:
+                    self.start_tool_call(call)
             updated = True
 
         return updated
 
     def try_call_function(self):
+        if self.tool_calls:
+            return self.try_call_tools()
 
-        dict = json.loads(self.function_arguments) if self.function_arguments != '' else None
+        dict = self.function_arguments_parser.loads() if self.function_arguments_parser else None
         if dict is None: return None
 
         result = self.function_factory.try_call_function(self.function_name, dict)
@@ -37,6 +60,41 @@ class FunctionCallContext:
 
         return result
 
+    def start_tool_call(self, call):
+        # Called as soon as a call's arguments are complete, so it runs while the rest of the message streams in
+        call['start'] = time.monotonic()
+        try:
+            arguments = call['arguments'].loads() if call['arguments'] else {}
+        except ValueError as e:
+            call['error'] = 'Error: the arguments are not valid JSON: %s' % e
+            return
+        call['future'] = self.function_factory.start_function(call['name'], arguments)
+
+    def try_call_tools(self):
+        # Every call the model asked for gets a result message, in the order of the calls
+        for call in self.tool_calls:
+            if call['start'] is None:
+                self.start_tool_call(call)
+        return self.record_tool_calls(self.tool_calls)
+
+    def record_started_calls(self):
+        # Called when the turn stops mid-stream. Calls dispatched early may already have had side effects, so
+        # they aren't dropped: ones still queued are cancelled, and the others are waited for and recorded
+        started = [call for call in self.tool_calls if call['future'] is not None and not call['future'].cancel()]
+        return self.record_tool_calls(started) if started else None
+
+    def record_tool_calls(self, calls):
+        results = self.function_factory.get_results([(call['name'], call['future'], call['start']) for call in calls])
+        results = [call.get('error') or result for call, result in zip(calls, results)]
+
+        self.messages.append({'role': 'assistant', 'content': None, 'tool_calls': [
+            {'id': call['id'], 'type': 'function', 'function': {'name': call['name'], 'arguments': call['arguments'].text}} for call in calls]})
+        for call, result in zip(calls, results):
+            self.messages.append({'role': 'tool', 'tool_call_id': call['id'], 'content': result})
+
+        return results
+
     def clear(self):
         self.function_name = ''
-        self.function_arguments = ''
\ No newline at end of file
+        self.function_arguments_parser = IncrementalJsonParser()
+        self.tool_calls = []
\ No newline at end of file
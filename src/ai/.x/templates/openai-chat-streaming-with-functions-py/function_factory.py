@@ -1,16 +1,124 @@
+import asyncio
+import inspect
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from frozen_json import freeze
+from function_cache import get_cache_policy, shared_function_cache
+from schema_validator import compile_validator, format_validation_error
+
 class FunctionFactory:
-    def __init__(self):
+    def __init__(self, max_workers=8, timeout=None, cache=None):
         self.functions = {}
+        self.schemas = None
+        self.tools = None
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache = cache or shared_function_cache
+        self.executor = None
+        self.loop = None
+        self.lock = threading.Lock()
 
-    def add_function(self, schema, func):
-        self.functions[schema['name']] = {'schema': schema, 'function': func}
+    def add_function(self, schema, func, timeout=None, cache=None):
+        # The parameters schema is compiled into a validator here, once, rather than interpreted on every call
+        self.functions[schema['name']] = {'schema': schema, 'function': func, 'timeout': timeout, 'cache': get_cache_policy(cache),
+            'validate': compile_validator(schema.get('parameters'))}
+        self.schemas = None
+        self.tools = None
 
+    # Built once per change to the registry and shared by every request, rather than rebuilt each turn,
+    # so they are frozen: changing one would change what every later request sends
     def get_function_schemas(self):
-        return [value['schema'] for value in self.functions.values()]
+        if self.schemas is None:
+            self.schemas = freeze([value['schema'] for value in self.functions.values()])
+        return self.schemas
+
+    def get_tools(self):
+        if self.tools is None:
+            self.tools = freeze([
+                {"type": "function", "function": value["schema"]}
+                for value in self.functions.values()
+            ])
+        return self.tools
+
+    def validate_arguments(self, function_name, function_arguments):
+        # Returns the arguments with obvious coercions applied (e.g. "3" for an integer) and None, or None
+        # and an error message for the model, so a bad call is answered without ever reaching the function
+        arguments, errors = self.functions[function_name]['validate'](function_arguments)
+        return (arguments, None) if errors is None else (None, format_validation_error(function_name, errors))
 
     def try_call_function(self, function_name, function_arguments):
-        function_info = self.functions.get(function_name)
-        if function_info is None:
+        if function_name not in self.functions:
+            return None
+
+        arguments, error = self.validate_arguments(function_name, function_arguments)
+        return error if error is not None else self.call_function(function_name, arguments)
+
+    def call_function(self, function_name, function_arguments):
+        function_info = self.functions[function_name]
+        if function_info['cache'] is not None:
+            return self.cache.call(function_name, function_arguments, function_info['cache'], function_info['function'])
+        return function_info['function'](function_arguments)
+
+    async def try_call_async_function(self, function_name, function_arguments):
+        function_info = self.functions[function_name]
+        if function_info['cache'] is not None:
+            return await self.cache.call_async(function_name, function_arguments, function_info['cache'], function_info['function'])
+        return await function_info['function'](function_arguments)
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='function')
+            return self.executor
+
+    def get_loop(self):
+        # Async functions run on one event loop in a background thread, shared by all calls
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name='function-loop', daemon=True).start()
+            return self.loop
+
+    def submit_function(self, function_name, function_arguments):
+        if inspect.iscoroutinefunction(self.functions[function_name]['function']):
+            return asyncio.run_coroutine_threadsafe(self.try_call_async_function(function_name, function_arguments), self.get_loop())
+        return self.get_executor().submit(self.call_function, function_name, function_arguments)
+
+    def start_function(self, function_name, function_arguments):
+        # Returns a future for the call's result, or None if there is no such function
+        if function_name not in self.functions:
             return None
 
-        return function_info['function'](function_arguments)
\ No newline at end of file
+        arguments, error = self.validate_arguments(function_name, function_arguments)
+        if error is not None:
+            future = Future()
+            future.set_result(error)
+            return future
+        return self.submit_function(function_name, arguments)
+
+    def call_functions(self, calls):
+        # Runs (name, arguments) calls concurrently and returns their results in the same order
+        start = time.monotonic()
+        return self.get_results([(name, self.start_function(name, arguments), start) for name, arguments in calls])
+
+    def get_results(self, started_calls):
+        # Waits for (name, future, start time) calls. Failures come back as error text for the model,
+        # so one bad call doesn't lose the others' results.
+        results = []
+        for name, future, start in started_calls:
+            if future is None:
+                results.append('Error: there is no function named %r' % name)
+                continue
+
+            timeout = self.functions[name]['timeout'] or self.timeout
+            try:
+                result = future.result(None if timeout is None else max(0.0, start + timeout - time.monotonic()))
+                results.append(result if isinstance(result, str) else json.dumps(result, default=str))
+            except TimeoutError:
+                future.cancel()
+                results.append('Error: %s did not finish within %ss' % (name, timeout))
+            except Exception as e:
+                results.append('Error: %s failed: %s' % (name, e))
+        return results
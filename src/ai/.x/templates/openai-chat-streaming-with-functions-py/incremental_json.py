@@ -0,0 +1,65 @@
+import json
+import re
+
+STRUCTURAL = re.compile(r'[{}\[\]"]')
+STRING_SPECIAL = re.compile(r'["\\]')
+
+class IncrementalJsonParser:
+    # Follows just enough of JSON (nesting, strings, escapes) to know, as fragments stream in, when the
+    # top-level object or array is complete. Each fragment is scanned once and the text is joined once.
+    def __init__(self):
+        self.fragments = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.complete = False
+        self.joined = None
+
+    def __bool__(self):
+        return bool(self.fragments)
+
+    def feed(self, fragment):
+        if not fragment:
+            return self.complete
+        self.fragments.append(fragment)
+        self.joined = None
+        if self.complete:
+            return True
+
+        position = 0
+        if self.escaped:
+            position, self.escaped = 1, False
+
+        while True:
+            match = (STRING_SPECIAL if self.in_string else STRUCTURAL).search(fragment, position)
+            if match is None:
+                break
+            char, position = match.group(), match.end()
+
+            if self.in_string:
+                if char == '"':
+                    self.in_string = False
+                elif position < len(fragment):
+                    position += 1 # skip the escaped character
+                else:
+                    self.escaped = True # the escaped character starts the next fragment
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.complete = True
+                    break
+
+        return self.complete
+
+    @property
+    def text(self):
+        if self.joined is None:
+            self.joined = ''.join(self.fragments)
+        return self.joined
+
+    def loads(self):
+        return json.loads(self.text)
@@ -1,5 +1,7 @@
 from openai_chat_completions_custom_functions import factory
 from openai_chat_completions_functions_streaming import OpenAIChatCompletionsFunctionsStreaming
+from batch_runner import run_batch
+from output_sinks import CoalescingOutput, StdoutSink
 import os
 import sys
 
@@ -10,7 +12,13 @@ def main():
     openai_chat_deployment_name = os.getenv('AZURE_OPENAI_CHAT_DEPLOYMENT', '{AZURE_OPENAI_CHAT_DEPLOYMENT}')
     openai_system_prompt = os.getenv('AZURE_OPENAI_SYSTEM_PROMPT', '{AZURE_OPENAI_SYSTEM_PROMPT}')
 
+    if len(sys.argv) > 3 and sys.argv[1] == '--batch':
+        concurrency = int(sys.argv[4]) if len(sys.argv) > 4 else 8
+        run_batch(lambda: OpenAIChatCompletionsFunctionsStreaming(openai_api_version, openai_endpoint, openai_api_key, openai_chat_deployment_name, openai_system_prompt, factory), sys.argv[2], sys.argv[3], concurrency)
+        return
+
     chat = OpenAIChatCompletionsFunctionsStreaming(openai_api_version, openai_endpoint, openai_api_key, openai_chat_deployment_name, openai_system_prompt, factory)
+    output = CoalescingOutput(StdoutSink())
 
     while True:
         user_input = input('User: ')
@@ -18,7 +26,8 @@ def main():
             break
 
         print("\nAssistant: ", end="")
-        response = chat.get_chat_completions(user_input, lambda content: print(content, end=""))
+        response = chat.get_chat_completions(user_input, output)
+        output.flush()
         print("\n")
 
 if __name__ == '__main__':
@@ -1,58 +1,117 @@
+import time
 from openai import AzureOpenAI
 from function_call_context import FunctionCallContext
+from chat_history import ChatHistory
+from chat_history_file import ChatHistoryFile
+from http_clients import get_http_client
+from stream_control import NO_STOP_CONDITIONS, ReadAhead, close_stream
+from raw_sse import create_raw_stream, iter_raw_chunks
 
 class OpenAIChatCompletionsFunctionsStreaming:
-    def __init__(self, openai_api_version, openai_endpoint, openai_key, openai_chat_deployment_name, openai_system_prompt, function_factory):
+    def __init__(self, openai_api_version, openai_endpoint, openai_key, openai_chat_deployment_name, openai_system_prompt, function_factory, max_history_tokens=None, history_summarizer=None, completion_options=None, metrics=None, http_client=None, rate_limiter=None, history_file=None, raw_stream=False, stop_conditions=None, use_tools=False, read_ahead=None):
         self.openai_system_prompt = openai_system_prompt
+        self.max_history_tokens = max_history_tokens
+        self.history_summarizer = history_summarizer
+        self.history_file = ChatHistoryFile(history_file) if isinstance(history_file, str) else history_file
+        self.completion_options = completion_options or {}
+        self.stop_conditions = stop_conditions or NO_STOP_CONDITIONS
+        self.read_ahead = read_ahead
+        self.metrics = metrics
+        self.rate_limiter = rate_limiter
+        self.raw_stream = raw_stream
         self.openai_chat_deployment_name = openai_chat_deployment_name
         self.function_factory = function_factory
+        self.use_tools = use_tools
         self.client = AzureOpenAI(
             api_key=openai_key,
             api_version=openai_api_version,
-            azure_endpoint = openai_endpoint
+            azure_endpoint = openai_endpoint,
+            http_client = http_client or get_http_client()
             )
         self.clear_conversation()
 
     def clear_conversation(self):
-        self.messages = [
-            {'role': 'system', 'content': self.openai_system_prompt}
-        ]
+        self.messages = ChatHistory(
+            [{'role': 'system', 'content': self.openai_system_prompt}],
+            max_tokens=self.max_history_tokens,
+            summarizer=self.history_summarizer,
+            history_file=self.history_file)
         self.function_call_context = FunctionCallContext(self.function_factory, self.messages)
 
-    def get_chat_completions(self, user_input, callback):
+    def create_chat_completion(self, **request):
+        if self.rate_limiter is None:
+            return create_raw_stream(self.client.chat.completions, **request) if self.raw_stream else self.client.chat.completions.create(**request)
+        # The limiter does its own throttling and retries, so the SDK's are turned off
+        return self.rate_limiter.call(self.client.with_options(max_retries=0).chat.completions, parse=iter_raw_chunks if self.raw_stream else None, **request)
+
+    def get_chat_completions(self, user_input, callback, cancel_token=None):
         self.messages.append({'role': 'user', 'content': user_input})
 
-        complete_content = ''
-        functions = self.function_factory.get_function_schemas()
+        turn = self.metrics.start_turn(self.openai_chat_deployment_name) if self.metrics else None
+        stop = self.stop_conditions.start(cancel_token)
+        content_chunks = []
+        if self.use_tools:
+            # The model can ask for several calls at once; they run concurrently, in one round trip
+            function_options = {'tools': self.function_factory.get_tools(), 'tool_choice': 'auto'}
+        else:
+            function_options = {'functions': self.function_factory.get_function_schemas(), 'function_call': 'auto'}
 
         while True:
-            response = self.client.chat.completions.create(
+            self.messages.trim()
+            if turn: turn.on_request()
+            response = self.create_chat_completion(
                 model=self.openai_chat_deployment_name,
                 messages=self.messages,
                 stream=True,
-                functions=functions,
-                function_call='auto')
+                **function_options,
+                **self.completion_options)
+            if self.read_ahead:
+                # Read the HTTP stream on its own thread, so a slow callback doesn't stall it
+                response = ReadAhead(response, self.read_ahead)
+
+            try:
+                for chunk in response:
 
-            for chunk in response:
+                    if turn: turn.on_chunk(chunk)
+                    choice0 = chunk.choices[0] if hasattr(chunk, 'choices') and chunk.choices else None
+                    self.function_call_context.check_for_update(choice0)
 
-                choice0 = chunk.choices[0] if hasattr(chunk, 'choices') and chunk.choices else None
-                self.function_call_context.check_for_update(choice0)
+                    delta = choice0.delta if choice0 and hasattr(choice0, 'delta') else None
+                    content = delta.content if delta and hasattr(delta, 'content') else ''
 
-                delta = choice0.delta if choice0 and hasattr(choice0, 'delta') else None
-                content = delta.content if delta and hasattr(delta, 'content') else ''
+                    finish_reason = choice0.finish_reason if choice0 and hasattr(choice0, 'finish_reason') else None
+                    if finish_reason == 'length':
+                        content += f"{content}\nERROR: Exceeded max token length!"
 
-                finish_reason = choice0.finish_reason if choice0 and hasattr(choice0, 'finish_reason') else None
-                if finish_reason == 'length':
-                    content += f"{content}\nERROR: Exceeded max token length!"
+                    if content is None: continue
 
-                if content is None: continue
+                    content = stop.check(content)
+                    content_chunks.append(content)
+                    stop.on_callback_result(callback(content))
 
-                complete_content += content
-                callback(content)
+                    if stop.reason:
+                        break
+            finally:
+                # However the loop ends (a stop condition, or an exception from a callback or sink), the stream
+                # is closed, and with it any reader thread
+                close_stream(response)
 
-            if self.function_call_context.try_call_function() is not None:
+            if stop.reason:
+                # Never call a function with arguments cut short, but keep any that already ran
+                self.function_call_context.record_started_calls()
+                self.function_call_context.clear()
+
+            function_start = time.perf_counter()
+            if not stop.reason and self.function_call_context.try_call_function() is not None:
+                if turn: turn.on_function_call(time.perf_counter() - function_start)
                 self.function_call_context.clear()
                 continue
 
+            complete_content = ''.join(content_chunks)
+            if turn and stop.reason:
+                turn.finish_reason = stop.reason
+            if turn:
+                self.metrics.end_turn(turn)
+
             self.messages.append({'role': 'assistant', 'content': complete_content})
             return complete_content
@@ -0,0 +1 @@
+{{@include openai.py/raw_sse.py}}
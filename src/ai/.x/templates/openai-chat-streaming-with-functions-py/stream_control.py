@@ -0,0 +1 @@
+{{@include openai.py/stream_control.py}}
@@ -0,0 +1,162 @@
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+API_VERSION = '2024-02-01'
+SYSTEM_PROMPT = 'You are a helpful AI assistant.'
+
+def create_streaming_chat(module, endpoint):
+    return module.OpenAIChatCompletionsStreaming(API_VERSION, endpoint, 'mock-key', 'mock-deployment', SYSTEM_PROMPT)
+
+def create_with_data_chat(module, endpoint):
+    embeddings_endpoint = f'{endpoint}/openai/deployments/mock-embedding/embeddings?api-version={API_VERSION}'
+    return module.OpenAIChatCompletionsStreamingWithData(API_VERSION, endpoint, 'mock-key', 'mock-deployment', SYSTEM_PROMPT, endpoint, 'mock-key', 'mock-index', embeddings_endpoint)
+
+def create_functions_chat(module, endpoint):
+    factory = importlib.import_module('openai_chat_completions_custom_functions').factory
+    return module.OpenAIChatCompletionsFunctionsStreaming(API_VERSION, endpoint, 'mock-key', 'mock-deployment', SYSTEM_PROMPT, factory)
+
+# `ai dev new <template> --python` output: module name, chat factory
+TEMPLATES = {
+    'openai-chat-streaming': ('openai_chat_completions_streaming', create_streaming_chat),
+    'openai-chat-streaming-with-data': ('openai_chat_completions_with_data_streaming', create_with_data_chat),
+    'openai-chat-streaming-with-functions': ('openai_chat_completions_functions_streaming', create_functions_chat),
+}
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def start_mock_server(args):
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_openai_server.py'),
+        '--tokens', str(args.tokens),
+        '--tokens-per-second', str(args.tokens_per_second),
+        '--jitter', str(args.jitter),
+        '--first-token-delay', str(args.first_token_delay)]
+    if args.replay:
+        command += ['--replay'] + args.replay
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    endpoint = process.stdout.readline().strip()
+    return process, endpoint
+
+def run_turns(create_chat, turns, prompt, results):
+    chat = create_chat()
+    for _ in range(turns):
+        chat.clear_conversation()
+
+        timings = {'first': None, 'deltas': 0}
+        def on_delta(content):
+            if timings['first'] is None:
+                timings['first'] = time.perf_counter()
+            timings['deltas'] += 1
+
+        start = time.perf_counter()
+        chat.get_chat_completions(prompt, on_delta)
+        end = time.perf_counter()
+
+        first = timings['first'] or end
+        generation = end - first
+        results.append({
+            'ttft': first - start,
+            'total': end - start,
+            'deltas': timings['deltas'],
+            'deltas_per_second': timings['deltas'] / generation if generation > 0 else float('nan'),
+        })
+
+def run_benchmark(args, endpoint):
+    sys.path.insert(0, os.path.abspath(args.project))
+    module_name, create = TEMPLATES[args.template]
+    module = importlib.import_module(module_name)
+    create_chat = lambda: create(module, endpoint)
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    results = []
+    threads = [threading.Thread(target=run_turns, args=(create_chat, args.turns, args.prompt, results)) for _ in range(args.concurrency)]
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+    deltas = sum(result['deltas'] for result in results)
+    report = {
+        'template': args.template,
+        'turns': len(results),
+        'concurrency': args.concurrency,
+        'wall_seconds': wall,
+        'ttft_p50_ms': percentile([r['ttft'] for r in results], 0.50) * 1000,
+        'ttft_p90_ms': percentile([r['ttft'] for r in results], 0.90) * 1000,
+        'ttft_p99_ms': percentile([r['ttft'] for r in results], 0.99) * 1000,
+        'deltas_per_second_p50': percentile([r['deltas_per_second'] for r in results], 0.50),
+        'aggregate_deltas_per_second': deltas / wall if wall > 0 else float('nan'),
+        'cpu_us_per_delta': cpu / deltas * 1e6 if deltas else float('nan'),
+    }
+
+    try:
+        from http_clients import all_pool_stats
+        pools = all_pool_stats()
+        report['http_requests'] = sum(pool['requests'] for pool in pools)
+        report['http_connections'] = sum(pool['connections'] for pool in pools)
+    except ImportError:
+        pass # generated before the shared connection pool existed
+
+    if args.trace_memory:
+        report['python_heap_peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+    try:
+        import resource
+        # ru_maxrss is in bytes on macOS, and in kilobytes everywhere else
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        report['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    except ImportError:
+        pass
+
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure client-side streaming overhead of a generated Python chat template against the local mock server')
+    parser.add_argument('--project', required=True, help='directory created by `ai dev new <template> --python`')
+    parser.add_argument('--template', choices=sorted(TEMPLATES), default='openai-chat-streaming')
+    parser.add_argument('--endpoint', help='use an already running mock server instead of starting one')
+    parser.add_argument('--turns', type=int, default=20, help='turns per concurrent session')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--prompt', default='Why is the sky blue?')
+    parser.add_argument('--tokens', type=int, default=256)
+    parser.add_argument('--tokens-per-second', type=float, default=0)
+    parser.add_argument('--jitter', type=float, default=0)
+    parser.add_argument('--first-token-delay', type=float, default=0)
+    parser.add_argument('--replay', nargs='*', default=[])
+    parser.add_argument('--trace-memory', action='store_true', help='report the Python heap peak (slows the run down)')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    process, endpoint = (None, args.endpoint) if args.endpoint else start_mock_server(args)
+    try:
+        report = run_benchmark(args, endpoint)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for name, value in report.items():
+        print(f'{name:>30}: {value:.3f}' if isinstance(value, float) else f'{name:>30}: {value}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import json
+import importlib
+import os
+import sys
+import time
+from openai import AzureOpenAI, DefaultHttpxClient, Stream
+from openai.types.chat import ChatCompletionChunk
+from mock_openai_server import LOREM, make_chunk
+
+# The HTTP library the SDK is built on (httpx, or httpx2 in newer SDKs), so responses are the kind its streams read
+http_library = importlib.import_module(DefaultHttpxClient.__mro__[1].__module__.split('.')[0])
+
+INCLUDES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'ai', '.x', 'templates', 'includes', 'openai.py')
+
+def make_sse_body(chunks, function_calls):
+    events = [make_chunk({'role': 'assistant', 'content': ''})]
+    for i in range(chunks):
+        if function_calls:
+            events.append(make_chunk({'function_call': {'arguments': LOREM[i % len(LOREM)]}}))
+        else:
+            events.append(make_chunk({'content': ' ' + LOREM[i % len(LOREM)]}))
+    events.append(make_chunk({}, 'function_call' if function_calls else 'stop'))
+    return ''.join(f'data: {json.dumps(event)}\n\n' for event in events).encode('utf-8') + b'data: [DONE]\n\n'
+
+def make_response(body):
+    return http_library.Response(200, content=body, headers={'content-type': 'text/event-stream'}, request=http_library.Request('POST', 'http://localhost/chat/completions'))
+
+def read_like_template(chunk):
+    # The per-chunk attribute walk the streaming templates do
+    choice0 = chunk.choices[0] if hasattr(chunk, 'choices') and chunk.choices else None
+    delta = choice0.delta if choice0 and hasattr(choice0, 'delta') else None
+    content = delta.content if delta and hasattr(delta, 'content') else ''
+    finish_reason = choice0.finish_reason if choice0 and hasattr(choice0, 'finish_reason') else None
+    function_call = delta.function_call if delta and hasattr(delta, 'function_call') else None
+    return content, finish_reason, function_call
+
+def run_sdk(client, body):
+    for chunk in Stream(cast_to=ChatCompletionChunk, response=make_response(body), client=client):
+        read_like_template(chunk)
+
+def run_raw(raw_sse, body):
+    class RawResponse:
+        http_response = make_response(body)
+    for chunk in raw_sse.iter_raw_chunks(RawResponse()):
+        read_like_template(chunk)
+
+def measure(run, arg, body, chunks, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.process_time()
+        run(arg, body)
+        best = min(best, time.process_time() - start)
+    return best / chunks * 1000 * 1000 # ms per 1k chunks
+
+def main():
+    parser = argparse.ArgumentParser(description='CPU per 1k streamed chunks: SDK ChatCompletionChunk models vs the raw SSE fast path (raw_sse.py)')
+    parser.add_argument('--project', default=INCLUDES, help='directory containing raw_sse.py (a generated project, or the template includes)')
+    parser.add_argument('--chunks', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.project))
+    import raw_sse
+
+    client = AzureOpenAI(api_key='mock-key', api_version='2024-02-01', azure_endpoint='http://localhost')
+    print(f"{'stream':>15} {'sdk ms/1k':>10} {'raw ms/1k':>10} {'speedup':>8}   (json decoder: {raw_sse.loads.__module__})")
+    for name, function_calls in [('content', False), ('function_call', True)]:
+        body = make_sse_body(args.chunks, function_calls)
+        sdk = measure(run_sdk, client, body, args.chunks, args.repeat)
+        raw = measure(run_raw, raw_sse, body, args.chunks, args.repeat)
+        print(f'{name:>15} {sdk:>10.2f} {raw:>10.2f} {sdk / raw:>7.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import importlib
+import os
+import sys
+import time
+
+from benchmark_chat_templates import TEMPLATES, start_mock_server
+
+class SlowSink:
+    # Stands in for TTS, a slow websocket client or a blocking logger
+    def __init__(self, delay):
+        self.delay = delay
+        self.parts = []
+
+    def write(self, text):
+        time.sleep(self.delay)
+        self.parts.append(text)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+def run_turn(chat, callback, prompt):
+    start = time.perf_counter()
+    content = chat.get_chat_completions(prompt, callback)
+    return content, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that a slow output sink does not stall reading the HTTP stream of a generated Python chat template')
+    parser.add_argument('--project', required=True, help='directory created by `ai dev new <template> --python`')
+    parser.add_argument('--template', choices=sorted(TEMPLATES), default='openai-chat-streaming')
+    parser.add_argument('--prompt', default='Why is the sky blue?')
+    parser.add_argument('--tokens', type=int, default=50)
+    parser.add_argument('--tokens-per-second', type=float, default=100)
+    parser.add_argument('--sink-delay', type=float, default=0.05, help='seconds the slow sink takes per write')
+    parser.add_argument('--jitter', type=float, default=0)
+    parser.add_argument('--first-token-delay', type=float, default=0)
+    parser.add_argument('--replay', nargs='*', default=[])
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.project))
+    module_name, create = TEMPLATES[args.template]
+    module = importlib.import_module(module_name)
+    from output_sinks import FanOutOutput
+
+    process, endpoint = start_mock_server(args)
+    try:
+        # Baseline: the sink is called straight from the reading loop, so every write holds up the stream
+        blocking_sink = SlowSink(args.sink_delay)
+        chat = create(module, endpoint)
+        _, blocking_seconds = run_turn(chat, blocking_sink.write, args.prompt)
+
+        # Decoupled: the stream is read on its own thread and the sink is fed through a coalescing queue
+        slow_sink = SlowSink(args.sink_delay)
+        output = FanOutOutput(slow_sink, policy='coalesce')
+        chat = create(module, endpoint)
+        chat.read_ahead = 1024
+        content, reading_seconds = run_turn(chat, output, args.prompt)
+        output.flush()
+    finally:
+        process.terminate()
+        process.wait()
+
+    stream_seconds = args.tokens / args.tokens_per_second if args.tokens_per_second else 0
+    print(f'{"stream duration":>30}: {stream_seconds:.3f}s')
+    print(f'{"blocking sink, stream read in":>30}: {blocking_seconds:.3f}s')
+    print(f'{"decoupled, stream read in":>30}: {reading_seconds:.3f}s')
+    print(f'{"decoupled, sink writes":>30}: {len(slow_sink.parts)} (coalesced {output.queues[0].coalesced})')
+
+    failures = []
+    if ''.join(slow_sink.parts) != content:
+        failures.append('the slow sink did not receive the full answer')
+    if reading_seconds > max(stream_seconds * 1.5, blocking_seconds / 2):
+        failures.append('the slow sink still stalls reading the stream')
+    for failure in failures:
+        print(f'FAILED: {failure}')
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
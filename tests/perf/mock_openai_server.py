@@ -0,0 +1,243 @@
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+LOREM = ('The sky appears blue because of a process called Rayleigh scattering. As sunlight reaches the '
+         'atmosphere, it is scattered in all directions by the gases and particles in the air. Blue light is '
+         'scattered more than other colors because it travels in shorter, smaller waves. ').split(' ')
+
+def load_recorded_streams(file_names):
+    streams = []
+    for file_name in file_names:
+        with open(file_name, 'r', encoding='utf-8-sig') as file:
+            recording = json.load(file)
+        for entry in recording.get('Entries', []):
+            if 'chat/completions' not in entry.get('RequestUri', ''):
+                continue
+            body = entry.get('ResponseBody')
+            if isinstance(body, list):
+                streams.append([event for event in body if event.strip()])
+    return streams
+
+def make_chunk(delta, finish_reason=None, model='mock-model'):
+    return {
+        'id': 'chatcmpl-mock',
+        'object': 'chat.completion.chunk',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+    }
+
+def make_embedding(text, dimensions):
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    generator = random.Random(seed)
+    vector = [generator.gauss(0, 1) for _ in range(dimensions)]
+    norm = sum(x * x for x in vector) ** 0.5
+    return [x / norm for x in vector]
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, tokens=64, tokens_per_second=50.0, jitter=0.2, first_token_delay=0.2, recorded_streams=None, embedding_dimensions=1536, throttle=0.0, retry_after_ms=100):
+        super().__init__(address, MockOpenAIRequestHandler)
+        self.tokens = tokens
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+        self.first_token_delay = first_token_delay
+        self.recorded_streams = recorded_streams or []
+        self.embedding_dimensions = embedding_dimensions
+        self.throttle = throttle
+        self.retry_after_ms = retry_after_ms
+        self.next_stream = 0
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def delay(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def token_delay(self):
+        if self.tokens_per_second > 0:
+            self.delay(1.0 / self.tokens_per_second)
+
+    def next_recorded_stream(self):
+        with self.lock:
+            stream = self.recorded_streams[self.next_stream % len(self.recorded_streams)]
+            self.next_stream += 1
+            return stream
+
+class MockOpenAIRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        with self.server.lock:
+            self.server.requests += 1
+
+        path = self.path.split('?')[0]
+        if random.random() < self.server.throttle:
+            self.send_json(429, {'error': {'code': '429', 'message': 'Requests to the deployment have exceeded the rate limit (mock).'}},
+                {'retry-after-ms': str(self.server.retry_after_ms), 'retry-after': str(max(1, self.server.retry_after_ms // 1000))})
+        elif path.endswith('/embeddings'):
+            self.send_embeddings(request)
+        elif path.endswith('/chat/completions'):
+            if request.get('stream'):
+                self.send_stream(request, with_data='/extensions/' in path)
+            else:
+                self.send_completion(request)
+        else:
+            self.send_json(404, {'error': {'code': 'NotFound', 'message': f'No mock for {path}'}})
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_embeddings(self, request):
+        inputs = request.get('input', [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        data = [{'object': 'embedding', 'index': i, 'embedding': make_embedding(text, self.server.embedding_dimensions)} for i, text in enumerate(inputs)]
+        tokens = sum(len(text.split()) for text in inputs)
+        self.send_json(200, {'object': 'list', 'data': data, 'model': 'mock-embedding', 'usage': {'prompt_tokens': tokens, 'total_tokens': tokens}})
+
+    def send_completion(self, request):
+        self.server.delay(self.server.first_token_delay)
+        content = ''.join(self.generate_tokens())
+        self.send_json(200, {
+            'id': 'chatcmpl-mock',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': 'mock-model',
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': self.server.tokens, 'total_tokens': self.server.tokens},
+        })
+
+    def send_stream(self, request, with_data):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        try:
+            self.server.delay(self.server.first_token_delay)
+            if self.server.recorded_streams:
+                for event in self.server.next_recorded_stream():
+                    self.write_event_text(event)
+                    self.server.token_delay()
+            else:
+                for chunk in self.generate_chunks(request, with_data):
+                    self.write_event(chunk)
+                    self.server.token_delay()
+            self.write_event_text('data: [DONE]\n\n')
+            self.wfile.write(b'0\r\n\r\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True # the client cancelled the stream
+
+    def write_event(self, chunk):
+        self.write_event_text(f'data: {json.dumps(chunk)}\n\n')
+
+    def write_event_text(self, text):
+        # Chunked transfer encoding, like the real service, so clients can keep the connection alive between turns
+        payload = text.encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(payload), payload))
+        self.wfile.flush()
+
+    def generate_tokens(self):
+        for i in range(self.server.tokens):
+            word = LOREM[i % len(LOREM)]
+            yield word if i == 0 else f' {word}'
+
+    def generate_chunks(self, request, with_data):
+        messages = request.get('messages', [])
+        last_role = messages[-1].get('role') if messages else None
+        answered_function = last_role in ('function', 'tool')
+
+        if with_data:
+            citations = [{'content': 'Rayleigh scattering makes the sky blue.', 'title': 'sky.md', 'url': None, 'filepath': 'sky.md', 'chunk_id': '0'}]
+            context = {'messages': [{'role': 'tool', 'content': json.dumps({'citations': citations, 'intent': '[]'}), 'end_turn': False}]}
+            yield make_chunk({'role': 'assistant', 'context': context})
+
+        if request.get('tools') and not answered_function:
+            yield from self.generate_tool_calls(request['tools'])
+            return
+
+        if request.get('functions') and not answered_function:
+            yield from self.generate_function_call(request['functions'][0])
+            return
+
+        yield make_chunk({'role': 'assistant', 'content': ''})
+        for token in self.generate_tokens():
+            yield make_chunk({'content': token})
+        yield make_chunk({}, 'stop')
+
+    def generate_function_call(self, function):
+        yield make_chunk({'role': 'assistant', 'content': None, 'function_call': {'name': function['name'], 'arguments': ''}})
+        for fragment in self.split_arguments(function):
+            yield make_chunk({'function_call': {'arguments': fragment}})
+        yield make_chunk({}, 'function_call')
+
+    def generate_tool_calls(self, tools):
+        for index, tool in enumerate(tools[:2]):
+            function = tool['function']
+            yield make_chunk({'role': 'assistant', 'content': None, 'tool_calls': [{'index': index, 'id': f'call_{index}', 'type': 'function', 'function': {'name': function['name'], 'arguments': ''}}]})
+            for fragment in self.split_arguments(function):
+                yield make_chunk({'tool_calls': [{'index': index, 'function': {'arguments': fragment}}]})
+        yield make_chunk({}, 'tool_calls')
+
+    def split_arguments(self, function):
+        properties = function.get('parameters', {}).get('properties', {})
+        arguments = json.dumps({name: 'Seattle, WA' if schema.get('type') == 'string' else 1 for name, schema in properties.items()})
+        return [arguments[i:i + 4] for i in range(0, len(arguments), 4)]
+
+def start_server(port=0, **kwargs):
+    server = MockOpenAIServer(('127.0.0.1', port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Azure OpenAI chat completions API (SSE streaming)')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--tokens', type=int, default=64, help='tokens per synthetic answer')
+    parser.add_argument('--tokens-per-second', type=float, default=50.0, help='0 streams as fast as possible')
+    parser.add_argument('--jitter', type=float, default=0.2, help='relative jitter applied to every delay')
+    parser.add_argument('--first-token-delay', type=float, default=0.2, help='seconds before the first chunk')
+    parser.add_argument('--replay', nargs='*', default=[], help='recordings (tests/recordings/*.json) to replay instead of synthetic answers')
+    parser.add_argument('--embedding-dimensions', type=int, default=1536)
+    parser.add_argument('--throttle', type=float, default=0.0, help='fraction of requests answered with 429 Too Many Requests')
+    parser.add_argument('--retry-after-ms', type=int, default=100, help='retry-after-ms sent with throttled responses')
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(('127.0.0.1', args.port),
+        tokens=args.tokens,
+        tokens_per_second=args.tokens_per_second,
+        jitter=args.jitter,
+        first_token_delay=args.first_token_delay,
+        recorded_streams=load_recorded_streams(args.replay),
+        embedding_dimensions=args.embedding_dimensions,
+        throttle=args.throttle,
+        retry_after_ms=args.retry_after_ms)
+
+    print(f'http://127.0.0.1:{server.server_port}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    sys.exit(main())